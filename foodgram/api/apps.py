@@ -3,3 +3,20 @@ from django.apps import AppConfig
 
 class ApiConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        register_trigram_lookup()
+
+
+def register_trigram_lookup():
+    """
+    Поиск по индексу pg_trgm оператором '%' для PostgreSQL без
+    подключения приложения 'django.contrib.postgres'.
+    """
+    from django.db import connection
+    if connection.vendor != 'postgresql':
+        return
+    from django.contrib.postgres.lookups import TrigramSimilar
+    from django.db.models import CharField
+    CharField.register_lookup(TrigramSimilar)
@@ -0,0 +1,121 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, FloatField, Q
+from django.db.models.functions import Cast
+
+from api.v1.caches import RECIPES_CONTENT_SCOPE, RECIPES_SCOPE, get_version
+from api.v1.cooking import build_cooking_index
+from head.models import IngredientRecipe, Recipe
+
+
+class Command(BaseCommand):
+    """
+    Замеряет подбор рецептов по имеющимся ингредиентам по индексу в памяти
+    и, для сравнения, запросом с группировкой по таблице ингредиентов
+    рецептов на данных текущей БД, например созданных командой
+    'generate_data'.
+    """
+
+    help = 'Замеряет поиск рецептов по имеющимся ингредиентам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ingredients', type=int, default=10,
+            help='Количество имеющихся ингредиентов в запросе.'
+        )
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument(
+            '--sql-repeat', type=int, default=3,
+            help='Количество запросов с группировкой (0 - без них).'
+        )
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def measure(self, func):
+        started = time.perf_counter()
+        result = func()
+        return (time.perf_counter() - started) * 1000, result
+
+    def sql_search(self, ingredient_ids, limit):
+        return list(Recipe.objects.annotate(
+            matched=Count(
+                'ingredientrecipe',
+                filter=Q(ingredientrecipe__ingredient__in=ingredient_ids)
+            ),
+            total=Count('ingredientrecipe')
+        ).filter(matched__gt=0).annotate(
+            coverage=Cast(F('matched'), FloatField()) / Cast(
+                F('total'), FloatField()
+            )
+        ).order_by('-coverage', '-matched', '-id').values_list(
+            'pk', 'coverage'
+        )[:limit])
+
+    def report(self, title, timings):
+        timings = sorted(timings)
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        self.stdout.write(
+            f'  {title}: медиана {statistics.median(timings):.2f} мс, '
+            f'p99 {p99:.2f} мс'
+        )
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        versions = [
+            get_version(RECIPES_SCOPE), get_version(RECIPES_CONTENT_SCOPE)
+        ]
+        build_time, index = self.measure(
+            lambda: build_cooking_index(versions)
+        )
+        dense = [
+            recipe_ids for recipe_ids in index.postings.values()
+            if isinstance(recipe_ids, int)
+        ]
+        memory = sum(
+            len(recipe_ids) * recipe_ids.itemsize
+            for recipe_ids in index.postings.values()
+            if not isinstance(recipe_ids, int)
+        ) + sum(
+            bitmap.bit_length() // 8
+            for bitmap in dense + list(index.size_bitmaps.values())
+        )
+        self.stdout.write(
+            f'Рецептов: {Recipe.objects.count()}  '
+            f'ингредиентов в индексе: {len(index.postings)}, '
+            f'из них битовыми картами: {len(dense)}  '
+            f'память: {memory / 2 ** 20:.1f} МБ  '
+            f'построение: {build_time / 1000:.1f} с'
+        )
+        # Запросы из ингредиентов с той же частотой, что и в рецептах.
+        used = list(IngredientRecipe.objects.values_list(
+            'ingredient', flat=True
+        ).order_by('?')[:100000])
+        queries = [
+            set(random.sample(used, options['ingredients']))
+            for _ in range(options['repeat'])
+        ]
+        limit = options['limit']
+        timings = []
+        for ingredient_ids in queries:
+            elapsed, _ = self.measure(
+                lambda: index.search(ingredient_ids, limit)
+            )
+            timings.append(elapsed)
+        self.report('индекс в памяти', timings)
+        timings = []
+        for ingredient_ids in queries[:options['sql_repeat']]:
+            elapsed, result = self.measure(
+                lambda: self.sql_search(ingredient_ids, limit)
+            )
+            timings.append(elapsed)
+            expected = [
+                round(coverage, 6)
+                for _, coverage in index.search(ingredient_ids, limit)
+            ]
+            if [round(coverage, 6) for _, coverage in result] != expected:
+                self.stderr.write('Результаты различаются.')
+        if timings:
+            self.report('GROUP BY в БД', timings)
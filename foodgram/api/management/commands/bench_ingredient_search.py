@@ -0,0 +1,103 @@
+import csv
+import os
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.v1.search import fuzzy_search_ingredients, get_ingredient_index
+from head.models import Ingredient
+
+DEFAULT_CSV = os.path.join(
+    os.path.dirname(settings.BASE_DIR), 'data', 'ingredients.csv'
+)
+
+
+class Command(BaseCommand):
+    """
+    Замеряет задержку поиска ингредиентов на каждое нажатие клавиши:
+    для случайных названий с опечаткой запросами служат все их начала.
+    Пустой справочник заполняется из CSV-файла в транзакции,
+    которая откатывается по окончании замеров.
+    """
+
+    help = 'Замеряет поиск ингредиентов по началу названия и нечёткий.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--names', type=int, default=200,
+            help='Количество названий, набираемых с опечаткой.'
+        )
+        parser.add_argument('--csv', default=DEFAULT_CSV)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        with transaction.atomic():
+            if not Ingredient.objects.exists():
+                self.load(options['csv'])
+            self.report(options['names'])
+            transaction.set_rollback(True)
+
+    def load(self, path):
+        with open(path, encoding='utf-8') as file:
+            Ingredient.objects.bulk_create(
+                Ingredient(name=name, measurement_unit=unit)
+                for name, unit in csv.reader(file)
+            )
+
+    def make_typo(self, name):
+        """Пропускает одну букву в середине названия."""
+        if len(name) < 4:
+            return name
+        position = random.randrange(1, len(name) - 1)
+        return name[:position] + name[position + 1:]
+
+    def measure(self, search, queries):
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            search(query)
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    def report(self, count):
+        limit = settings.INGREDIENTS_SEARCH_LIMIT
+        started = time.perf_counter()
+        index = get_ingredient_index()
+        index.trigram_index
+        built = (time.perf_counter() - started) * 1000
+        names = random.sample(index.names, min(count, len(index.names)))
+        typos = [self.make_typo(name) for name in names]
+        keystrokes = [
+            typo[:length]
+            for typo in typos
+            for length in range(1, len(typo) + 1)
+        ]
+        self.stdout.write(
+            f'Ингредиентов: {len(index.names)}  '
+            f'построение индекса: {built:.2f} мс  '
+            f'запросов: {len(keystrokes)}'
+        )
+        modes = {
+            'prefix': lambda query: index.search(query, limit),
+            'fuzzy': lambda query: fuzzy_search_ingredients(query, limit),
+        }
+        for mode, search in modes.items():
+            timings = self.measure(search, keystrokes)
+            found = sum(
+                name in [
+                    ingredient.name.lower() for ingredient in search(typo)
+                ]
+                for name, typo in zip(names, typos)
+            )
+            self.stdout.write(
+                f'  {mode:7} медиана: '
+                f'{statistics.median(timings):7.3f} мс  '
+                f'p99: {statistics.quantiles(timings, n=100)[98]:7.3f} мс  '
+                f'максимум: {max(timings):7.3f} мс  '
+                f'найдено с опечаткой: {found}/{len(names)}'
+            )
@@ -0,0 +1,64 @@
+import statistics
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from api.v1.pdfcache import RENDERERS, render
+
+
+class Command(BaseCommand):
+    """
+    Сравнивает время генерации и пиковое потребление памяти
+    PDF-файла списка покупок средствами ReportLab и xhtml2pdf.
+    """
+
+    help = 'Замеряет генерацию PDF-файла списка покупок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lines', type=int, nargs='+', default=[10, 100, 1000],
+            help='Количество строк в списке покупок.'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Количество повторов каждого замера.'
+        )
+
+    def get_items(self, count):
+        return [
+            {
+                'name': f'Ингредиент номер {i}',
+                'measurement_unit': 'г',
+                'total': i * 10
+            }
+            for i in range(count)
+        ]
+
+    def measure(self, items, renderer, repeat):
+        # Первый вызов прогревает шрифты и шаблоны.
+        render(items, renderer)
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            content = render(items, renderer)
+            timings.append((time.perf_counter() - started) * 1000)
+        tracemalloc.start()
+        render(items, renderer)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return statistics.median(timings), peak / 1024 / 1024, len(content)
+
+    def handle(self, *args, **options):
+        for count in options['lines']:
+            items = self.get_items(count)
+            self.stdout.write(f'Строк в списке: {count}')
+            for renderer in RENDERERS:
+                median, peak, size = self.measure(
+                    items, renderer, options['repeat']
+                )
+                self.stdout.write(
+                    f'  {renderer:10} медиана: {median:9.2f} мс  '
+                    f'пик памяти: {peak:8.2f} МБ  '
+                    f'размер файла: {size / 1024:8.1f} КБ'
+                )
@@ -0,0 +1,151 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+from api.v1.services import (aggregate_shopping_list, get_shopping_list,
+                             rebuild_shopping_lists)
+from head.models import Ingredient, IngredientRecipe, Recipe, ShoppingCart
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """
+    Сравнивает прежнюю агрегацию списка покупок с 'aggregate_shopping_list'
+    и чтением поддерживаемой таблицы 'get_shopping_list' на синтетических
+    корзинах. Данные создаются в транзакции, которая
+    откатывается по окончании замеров.
+    """
+
+    help = 'Замеряет агрегацию списка покупок на больших корзинах.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes', type=int, nargs='+', default=[50, 100, 200],
+            help='Размеры корзин (количество рецептов).'
+        )
+        parser.add_argument(
+            '--ingredients', type=int, default=10,
+            help='Количество ингредиентов в рецепте.'
+        )
+        parser.add_argument(
+            '--catalog', type=int, default=300,
+            help='Размер справочника ингредиентов.'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Количество повторов каждого запроса.'
+        )
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        with transaction.atomic():
+            for size in options['recipes']:
+                user = self.create_cart(size, options)
+                self.report(size, user, options['repeat'])
+            transaction.set_rollback(True)
+
+    def create_cart(self, size, options):
+        user = User.objects.create_user(
+            username=f'bench_cart_{size}',
+            email=f'bench_cart_{size}@foodgram.ru',
+            password='bench'
+        )
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'bench {size} {i}', measurement_unit='г')
+            for i in range(options['catalog'])
+        )
+        catalog = list(
+            Ingredient.objects.filter(name__startswith=f'bench {size} ')
+        )
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=user,
+                name=f'bench {size} {i}',
+                image='recipes/images/bench.png',
+                text='bench',
+                cooking_time=1
+            )
+            for i in range(size)
+        )
+        recipes = list(Recipe.objects.filter(author=user))
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(
+                recipe=recipe,
+                ingredient=ingredient,
+                amount=random.randint(1, 500)
+            )
+            for recipe in recipes
+            for ingredient in random.sample(catalog, options['ingredients'])
+        )
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=user, recipe=recipe) for recipe in recipes
+        )
+        rebuild_shopping_lists([user])
+        return user
+
+    def legacy_query(self, user):
+        return user.buy.values(
+            'recipe__ingredients__name',
+            'recipe__ingredients__measurement_unit'
+        ).annotate(total=Sum('recipe__ingredientrecipe__amount'))
+
+    def measure(self, query, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            rows = list(query())
+            timings.append((time.perf_counter() - started) * 1000)
+        return rows, statistics.median(timings), max(timings)
+
+    def report(self, size, user, repeat):
+        expected = dict(
+            IngredientRecipe.objects.filter(recipe__author=user).values(
+                'ingredient__name'
+            ).annotate(total=Sum('amount')).values_list(
+                'ingredient__name', 'total'
+            )
+        )
+        joined = {
+            'legacy': user.buy.values_list(
+                'recipe__ingredients', 'recipe__ingredientrecipe'
+            ).count(),
+            'service': IngredientRecipe.objects.filter(
+                recipe__buyer__user=user
+            ).count(),
+            'table': user.shopping_list.count()
+        }
+        results = {
+            'legacy': self.measure(lambda: self.legacy_query(user), repeat),
+            'service': self.measure(
+                lambda: aggregate_shopping_list(user), repeat
+            ),
+            'table': self.measure(lambda: get_shopping_list(user), repeat)
+        }
+        totals = {
+            'legacy': {
+                row['recipe__ingredients__name']: row['total']
+                for row in results['legacy'][0]
+            },
+            'service': {
+                row['name']: row['total'] for row in results['service'][0]
+            },
+            'table': {
+                row['name']: row['total'] for row in results['table'][0]
+            }
+        }
+        self.stdout.write(f'Корзина из {size} рецептов:')
+        for name in ('legacy', 'service', 'table'):
+            rows, median, worst = results[name]
+            self.stdout.write(
+                f'  {name:8} соединено строк: {joined[name]:8}  '
+                f'строк в ответе: {len(rows):5}  '
+                f'медиана: {median:8.2f} мс  максимум: {worst:8.2f} мс  '
+                f'суммы верны: {totals[name] == expected}'
+            )
@@ -0,0 +1,85 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from head.models import Recipe, Tag, get_tag_mask
+
+
+class Command(BaseCommand):
+    """
+    Сравнивает фильтрацию рецептов по нескольким тегам через соединение
+    с таблицами тегов и по маске тегов рецепта на данных текущей БД,
+    например созданных командой 'generate_data'.
+    """
+
+    help = 'Замеряет фильтрацию рецептов по тегам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tags', type=int, default=3,
+            help='Количество тегов в фильтре.'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Количество случайных наборов тегов.'
+        )
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def join_query(self, tags):
+        return Recipe.objects.filter(tags__slug__in=[
+            tag.slug for tag in tags
+        ]).distinct()
+
+    def mask_query(self, tags):
+        return Recipe.objects.annotate(
+            tag_match=F('tag_mask').bitand(
+                get_tag_mask(tag.pk for tag in tags)
+            )
+        ).exclude(tag_match=0)
+
+    def measure(self, func):
+        started = time.perf_counter()
+        result = func()
+        return (time.perf_counter() - started) * 1000, result
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        all_tags = list(Tag.objects.all())
+        limit = options['limit']
+        self.stdout.write(
+            f'Рецептов: {Recipe.objects.count()}  тегов: {len(all_tags)}  '
+            f'тегов в фильтре: {options["tags"]}'
+        )
+        timings = {
+            'join': {'page': [], 'count': []},
+            'mask': {'page': [], 'count': []},
+        }
+        for _ in range(options['repeat']):
+            tags = random.sample(all_tags, options['tags'])
+            results = {}
+            for name, query in (
+                ('join', self.join_query), ('mask', self.mask_query)
+            ):
+                page_time, page = self.measure(
+                    lambda: list(query(tags).values_list('pk', flat=True)[
+                        :limit
+                    ])
+                )
+                count_time, count = self.measure(lambda: query(tags).count())
+                timings[name]['page'].append(page_time)
+                timings[name]['count'].append(count_time)
+                results[name] = (page, count)
+            if results['join'] != results['mask']:
+                self.stderr.write(f'Результаты различаются: {tags}')
+        for name, kinds in timings.items():
+            self.stdout.write(
+                f'  {name:5} '
+                f'страница: медиана {statistics.median(kinds["page"]):8.2f} '
+                f'мс, максимум {max(kinds["page"]):8.2f} мс  '
+                f'count: медиана {statistics.median(kinds["count"]):8.2f} '
+                f'мс, максимум {max(kinds["count"]):8.2f} мс'
+            )
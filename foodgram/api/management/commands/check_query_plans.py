@@ -0,0 +1,183 @@
+import re
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.v1.filters import RECIPE_ORDERINGS
+from api.v1.paginators import CustomCursorPagination, CustomPagination
+from api.v1.views import RecipeViewSet
+from head.models import IngredientRecipe, Recipe, Tag, TagRecipe
+
+User = get_user_model()
+
+# Полный просмотр таблицы в планах PostgreSQL и SQLite
+# ('SCAN TABLE x' в старых версиях SQLite, 'SCAN x' в новых).
+SEQ_SCAN_PATTERNS = (
+    re.compile(r'Seq Scan on (\w+)'),
+    re.compile(r'\bSCAN (?:TABLE )?(\w+)'),
+)
+# Сортировка строк выборки вместо чтения по индексу в нужном порядке.
+SORT_PATTERNS = (
+    re.compile(r'\bSort\b'),
+    re.compile(r'USE TEMP B-TREE FOR (?:RIGHT PART OF )?ORDER BY'),
+)
+
+
+def get_seq_scans(plan):
+    """Таблицы, которые план запроса просматривает целиком."""
+    return {
+        match.group(1)
+        for pattern in SEQ_SCAN_PATTERNS
+        for match in pattern.finditer(plan)
+    }
+
+
+def has_sort(plan):
+    return any(pattern.search(plan) for pattern in SORT_PATTERNS)
+
+
+class Command(BaseCommand):
+    """
+    Выполняет EXPLAIN для частых запросов списка рецептов, его фильтров
+    и списка подписок и сообщает о полном просмотре больших таблиц.
+    Запросы строятся кодом RecipeViewSet, RecipeFilter
+    и SubscriptionSerializer, поэтому проверка следит за тем, чтобы
+    изменения кода и индексов не лишили их подходящих индексов.
+    Список рецептов сортируется по первичному ключу или индексам
+    сортировок, и его просмотр с LIMIT по ним допустим, но не
+    сортировка всех рецептов. При найденных полных просмотрах
+    и сортировках команда завершается с ошибкой.
+    """
+
+    help = (
+        'Проверяет планы частых запросов на полный просмотр таблиц '
+        'и сортировку без индекса.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-rows', type=int, default=1000,
+            help='Таблицы меньшего размера не проверяются.'
+        )
+
+    def handle(self, *args, **options):
+        self.min_rows = options['min_rows']
+        self.table_sizes = {}
+        self.sorted_titles = set()
+        user = User.objects.filter(following__isnull=False).first()
+        recipe = Recipe.objects.first()
+        if user is None or recipe is None:
+            raise CommandError(
+                'Нужны рецепты и подписки, например из generate_data.'
+            )
+        problems = 0
+        for title, queryset, allowed in self.get_checks(user, recipe):
+            plan = queryset.explain()
+            found = [
+                f'полный просмотр {table}'
+                for table in sorted(get_seq_scans(plan) - set(allowed))
+                if self.is_large(table)
+            ]
+            if title in self.sorted_titles and has_sort(plan) and (
+                self.is_large(Recipe._meta.db_table)
+            ):
+                found.append('сортировка без индекса')
+            problems += len(found)
+            if found:
+                self.stdout.write(self.style.ERROR(
+                    f'{title}: {", ".join(found)}'
+                ))
+            else:
+                self.stdout.write(f'{title}: OK')
+            if found or options['verbosity'] > 1:
+                self.stdout.write(plan)
+        if problems:
+            raise CommandError(f'Проблем в планах запросов: {problems}.')
+
+    def is_large(self, table):
+        if not self.table_sizes:
+            self.table_sizes = {
+                model._meta.db_table: model.objects.count()
+                for model in apps.get_models()
+            }
+        return self.table_sizes.get(table, 0) >= self.min_rows
+
+    def get_recipes(self, user, params):
+        """Страница списка рецептов в том виде, как её строит вьюсет."""
+        request = Request(APIRequestFactory().get('/api/recipes/', params))
+        request.user = user
+        view = RecipeViewSet(
+            request=request, action='list', args=(), kwargs={},
+            format_kwarg=None
+        )
+        queryset = view.filter_queryset(view.get_queryset())
+        return queryset[:CustomPagination.page_size]
+
+    def get_ordering_checks(self, user, recipe):
+        """
+        Первая страница каждой сортировки и страница после позиции
+        рецепта 'recipe' при пагинации по ключу: их выборка не должна
+        сортировать рецепты.
+        """
+        recipe_table = Recipe._meta.db_table
+        paginator = CustomCursorPagination()
+        for name, ordering in RECIPE_ORDERINGS.items():
+            title = f'Рецепты: сортировка {name}'
+            queryset = self.get_recipes(user, {'ordering': name})
+            self.sorted_titles.add(title)
+            yield title, queryset, (recipe_table,)
+            paginator.ordering = ordering
+            position = paginator._get_position_from_instance(
+                recipe, ordering
+            )
+            for number, condition in enumerate(
+                paginator.get_position_filters(Recipe, position, False), 1
+            ):
+                title = f'Рецепты: сортировка {name}, по ключу {number}'
+                self.sorted_titles.add(title)
+                yield title, Recipe.objects.filter(condition).order_by(
+                    *ordering
+                )[:CustomPagination.page_size], (recipe_table,)
+
+    def get_checks(self, user, recipe):
+        """Название запроса, запрос и таблицы, которые можно просматривать."""
+        recipe_table = Recipe._meta.db_table
+        tags = list(Tag.objects.values_list('slug', flat=True)[:3])
+        for title, params in (
+            ('Рецепты', {}),
+            ('Рецепты: время приготовления',
+             {'cooking_time__gte': 10, 'cooking_time__lte': 20}),
+            ('Рецепты: избранное', {'is_favorited': 1}),
+            ('Рецепты: список покупок', {'is_in_shopping_cart': 1}),
+            ('Рецепты: автор', {'author': recipe.author_id}),
+            ('Рецепты: теги', {'tags': tags}),
+        ):
+            yield title, self.get_recipes(user, params), (recipe_table,)
+        yield from self.get_ordering_checks(user, recipe)
+        recipe_ids = list(
+            self.get_recipes(user, {}).values_list('pk', flat=True)
+        )
+        yield 'Рецепты: теги страницы', TagRecipe.objects.filter(
+            recipe__in=recipe_ids
+        ).select_related('tag'), ()
+        yield 'Рецепты: ингредиенты страницы', IngredientRecipe.objects.filter(
+            recipe__in=recipe_ids
+        ).select_related('ingredient'), ()
+        subscriptions = User.objects.filter(subscriber__user=user)
+        yield 'Подписки', subscriptions, ()
+        # Запросы SubscriptionSerializer для каждого автора на странице.
+        author = subscriptions.first()
+        yield 'Подписки: рецепты автора', author.recipes.all()[:3], ()
+        yield 'Подписки: число рецептов автора', author.recipes.all(), ()
+        yield 'Подписки: подписка на автора', author.subscriber.filter(
+            user=user
+        ), ()
+        yield 'Подписчики автора', author.subscriber.all(), ()
+        yield 'Рецепты тегов', TagRecipe.objects.filter(
+            tag__slug__in=tags
+        ).values('recipe'), ()
+        yield 'Рецепты: поклонники', recipe.lover.all(), ()
+        yield 'Рецепты: в списках покупок', recipe.buyer.all(), ()
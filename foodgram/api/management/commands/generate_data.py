@@ -0,0 +1,309 @@
+import os
+import random
+import time
+from io import BytesIO
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from PIL import Image
+
+from api.v1.caches import (INGREDIENTS_SCOPE, RECIPES_CONTENT_SCOPE,
+                           RECIPES_SCOPE, TAGS_SCOPE, bump_version_on_commit)
+from api.v1.search import rebuild_recipe_search_index
+from api.v1.services import (import_ingredients, rebuild_favorites_counts,
+                             rebuild_shopping_lists)
+from head.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                         ShoppingCart, Subscription, Tag, TagRecipe,
+                         get_tag_mask)
+
+from .load_ingredients import DEFAULT_PATH, iter_csv
+
+User = get_user_model()
+
+IMAGE_COLORS = (
+    '#E26C2D', '#49B64E', '#8775D2', '#F2C94C',
+    '#EB5757', '#2D9CDB', '#9B51E0', '#6FCF97',
+)
+
+
+def zipf_cum_weights(count, exponent):
+    """Накопленные веса рангов 1..count по закону Ципфа."""
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)
+    ))
+
+
+class ZipfSampler:
+    """
+    Выбирает значения с частотой, убывающей по закону Ципфа. Ранги
+    популярности распределяются по значениям случайно, чтобы самыми
+    популярными не оказывались первые созданные объекты.
+    """
+
+    def __init__(self, values, exponent):
+        self.values = list(values)
+        random.shuffle(self.values)
+        self.cum_weights = zipf_cum_weights(len(self.values), exponent)
+
+    def sample(self, count):
+        """До 'count' различных значений."""
+        if not count or not self.values:
+            return set()
+        return set(random.choices(
+            self.values, cum_weights=self.cum_weights, k=count
+        ))
+
+
+class Command(BaseCommand):
+    """
+    Создаёт синтетических пользователей и рецепты с тегами
+    и ингредиентами, избранным, списками покупок и подписками для
+    нагрузочного тестирования. Популярность рецептов, авторов
+    и ингредиентов распределена по закону Ципфа, число записей
+    пользователя - экспоненциально. Объекты вставляются пачками через
+    bulk_create с заранее назначенными id, при одинаковом '--seed'
+    данные повторяются.
+    """
+
+    help = 'Создаёт синтетические данные для нагрузочного тестирования.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--tags', type=int, default=16,
+            help='Необходимое количество тегов.'
+        )
+        parser.add_argument(
+            '--ingredients', type=int, default=8,
+            help='Наибольшее количество ингредиентов в рецепте.'
+        )
+        parser.add_argument(
+            '--favorites', type=float, default=10,
+            help='Среднее количество избранных рецептов пользователя.'
+        )
+        parser.add_argument(
+            '--cart', type=float, default=3,
+            help='Среднее количество рецептов в списке покупок.'
+        )
+        parser.add_argument(
+            '--subscriptions', type=float, default=5,
+            help='Среднее количество подписок пользователя.'
+        )
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Показатель степени распределения Ципфа.'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        self.options = options
+        self.batch_size = options['batch_size']
+        started = time.perf_counter()
+        with transaction.atomic():
+            tag_ids = self.ensure_tags(options['tags'])
+            ingredient_ids = self.ensure_ingredients()
+            images = self.save_images()
+            user_ids = self.create_users(options['users'])
+            recipe_ids = self.create_recipes(
+                options['recipes'], user_ids, tag_ids, ingredient_ids, images
+            )
+            self.create_user_lists(user_ids, recipe_ids)
+            self.reset_sequences()
+            self.step(
+                'Полнотекстовый индекс рецептов',
+                rebuild_recipe_search_index
+            )
+            self.step('Счётчики избранного', rebuild_favorites_counts)
+            self.step(
+                'Суммарные списки покупок', rebuild_shopping_lists,
+                None, self.batch_size
+            )
+            for scope in (
+                RECIPES_SCOPE, RECIPES_CONTENT_SCOPE, TAGS_SCOPE,
+                INGREDIENTS_SCOPE
+            ):
+                bump_version_on_commit(scope)
+        self.stdout.write(
+            f'Готово за {time.perf_counter() - started:.1f} с'
+        )
+
+    def step(self, title, func, *args):
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.stdout.write(
+                f'  {title}: {time.perf_counter() - started:.1f} с'
+            )
+
+    def bulk_create(self, model, objects):
+        """Вставляет объекты пачками, не собирая их все в памяти."""
+        batch, created = [], 0
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                model.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        model.objects.bulk_create(batch)
+        return created + len(batch)
+
+    def next_id(self, model):
+        return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+    def ensure_tags(self, count):
+        existing = Tag.objects.count()
+        first = self.next_id(Tag)
+        Tag.objects.bulk_create(
+            Tag(
+                name=f'Тег {number}',
+                color=f'#{number * 0x9E3779 % 0x1000000:06X}',
+                slug=f'tag-{number}'
+            )
+            for number in range(first, first + count - existing)
+        )
+        return list(Tag.objects.values_list('pk', flat=True))
+
+    def ensure_ingredients(self):
+        if not Ingredient.objects.exists():
+            with open(DEFAULT_PATH, encoding='utf-8', newline='') as file:
+                import_ingredients(iter_csv(file), self.batch_size)
+        return list(Ingredient.objects.values_list('pk', flat=True))
+
+    def save_images(self):
+        """Крошечные картинки-заглушки, общие для всех рецептов."""
+        names = []
+        for number, color in enumerate(IMAGE_COLORS):
+            name = os.path.join(
+                'recipes', 'images', f'synthetic_{number}.gif'
+            )
+            if not default_storage.exists(name):
+                buffer = BytesIO()
+                Image.new('RGB', (1, 1), color).save(buffer, 'GIF')
+                name = default_storage.save(
+                    name, ContentFile(buffer.getvalue())
+                )
+            names.append(name)
+        return names
+
+    def create_users(self, count):
+        first = self.next_id(User)
+        ids = range(first, first + count)
+        password = make_password('synthetic')
+        self.step('Пользователи', self.bulk_create, User, (
+            User(
+                pk=pk,
+                username=f'synthetic{pk}',
+                email=f'synthetic{pk}@foodgram.ru',
+                first_name='Имя',
+                last_name='Фамилия',
+                password=password
+            )
+            for pk in ids
+        ))
+        return list(ids)
+
+    def get_cooking_time(self):
+        return min(600, max(1, int(random.lognormvariate(3.3, 0.6))))
+
+    def create_recipes(self, count, user_ids, tag_ids, ingredient_ids,
+                       images):
+        first = self.next_id(Recipe)
+        ids = range(first, first + count)
+        authors = ZipfSampler(user_ids, self.options['zipf'])
+        ingredients = ZipfSampler(ingredient_ids, self.options['zipf'])
+        tags, recipe_ingredients = [], []
+
+        def recipes():
+            for pk in ids:
+                recipe_tags = random.sample(
+                    tag_ids, random.randint(1, min(3, len(tag_ids)))
+                )
+                tags.append((pk, recipe_tags))
+                recipe_ingredients.append((pk, ingredients.sample(
+                    random.randint(1, self.options['ingredients'])
+                )))
+                yield Recipe(
+                    pk=pk,
+                    author_id=authors.sample(1).pop(),
+                    name=f'Рецепт {pk}',
+                    image=random.choice(images),
+                    text='Синтетический рецепт для нагрузочного теста.',
+                    cooking_time=self.get_cooking_time(),
+                    tag_mask=get_tag_mask(recipe_tags)
+                )
+                if len(tags) >= self.batch_size:
+                    self.create_recipe_relations(tags, recipe_ingredients)
+
+        self.step('Рецепты с тегами и ингредиентами', self.bulk_create,
+                  Recipe, recipes())
+        self.create_recipe_relations(tags, recipe_ingredients)
+        return list(ids)
+
+    def create_recipe_relations(self, tags, recipe_ingredients):
+        """Вставляет теги и ингредиенты накопленной пачки рецептов."""
+        TagRecipe.objects.bulk_create(
+            TagRecipe(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id, tag_ids in tags
+            for tag_id in tag_ids
+        )
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(
+                recipe_id=recipe_id,
+                ingredient_id=ingredient_id,
+                amount=random.randint(1, 500)
+            )
+            for recipe_id, ingredient_ids in recipe_ingredients
+            for ingredient_id in ingredient_ids
+        )
+        tags.clear()
+        recipe_ingredients.clear()
+
+    def get_list_size(self, mean):
+        return int(random.expovariate(1 / mean)) if mean else 0
+
+    def create_user_lists(self, user_ids, recipe_ids):
+        recipes = ZipfSampler(recipe_ids, self.options['zipf'])
+        authors = ZipfSampler(user_ids, self.options['zipf'])
+        options = self.options
+        self.step('Избранное', self.bulk_create, Favorite, (
+            Favorite(user_id=user_id, recipe_id=recipe_id)
+            for user_id in user_ids
+            for recipe_id in recipes.sample(
+                self.get_list_size(options['favorites'])
+            )
+        ))
+        self.step('Списки покупок рецептов', self.bulk_create, ShoppingCart, (
+            ShoppingCart(user_id=user_id, recipe_id=recipe_id)
+            for user_id in user_ids
+            for recipe_id in recipes.sample(
+                self.get_list_size(options['cart'])
+            )
+        ))
+        self.step('Подписки', self.bulk_create, Subscription, (
+            Subscription(user_id=user_id, author_id=author_id)
+            for user_id in user_ids
+            for author_id in authors.sample(
+                self.get_list_size(options['subscriptions'])
+            )
+            if author_id != user_id
+        ))
+
+    def reset_sequences(self):
+        """Продвигает последовательности id после вставки с явными id."""
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [User, Recipe, Tag]
+        )
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
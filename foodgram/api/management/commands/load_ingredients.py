@@ -0,0 +1,96 @@
+import csv
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.v1.services import import_ingredients
+
+DEFAULT_PATH = os.path.join(
+    os.path.dirname(settings.BASE_DIR), 'data', 'ingredients.csv'
+)
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_csv(file):
+    for row in csv.reader(file):
+        if len(row) >= 2:
+            yield row[0], row[1]
+
+
+def iter_json(file):
+    """
+    Читает массив объектов JSON по частям, не загружая файл целиком.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    while True:
+        chunk = file.read(CHUNK_SIZE)
+        buffer += chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started and buffer[position:position + 1] == '[':
+                started = True
+                position += 1
+                continue
+            if buffer[position:position + 1] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break
+            yield item['name'], item['measurement_unit']
+        buffer = buffer[position:]
+        if not chunk:
+            if buffer.strip():
+                raise CommandError('Файл JSON оборван.')
+            return
+
+
+READERS = {
+    'csv': iter_csv,
+    'json': iter_json,
+}
+
+
+class Command(BaseCommand):
+    """
+    Загружает справочник ингредиентов из CSV-файла (название, единица
+    измерения) или JSON-массива объектов с полями 'name'
+    и 'measurement_unit'. Файл читается потоком, ингредиенты
+    добавляются пачками в одной транзакции, уже имеющиеся пропускаются.
+    """
+
+    help = 'Загружает ингредиенты из CSV или JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=DEFAULT_PATH)
+        parser.add_argument(
+            '--format', choices=READERS,
+            help='Формат файла (по умолчанию - по расширению).'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = (
+            options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        )
+        if file_format not in READERS:
+            raise CommandError('Укажите формат файла: csv или json.')
+        started = time.perf_counter()
+        with open(path, encoding='utf-8', newline='') as file:
+            read, created = import_ingredients(
+                READERS[file_format](file), options['batch_size']
+            )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'Прочитано строк: {read}  добавлено ингредиентов: {created}  '
+            f'время: {elapsed:.2f} с  '
+            f'скорость: {read / elapsed if elapsed else 0:.0f} строк/с'
+        )
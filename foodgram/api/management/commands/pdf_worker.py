@@ -0,0 +1,91 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.v1.pdfcache import PdfRenderError, render
+from api.v1.pdfjobs import (claim_jobs, fail_job, fall_back, finish_job,
+                            prepare_job, purge_jobs, requeue_stale_jobs)
+
+
+class Command(BaseCommand):
+    """
+    Выполняет задачи фоновой генерации PDF-файлов списков покупок.
+    Очередью служит таблица задач в БД, генерация выполняется
+    в пуле процессов, чтения и записи БД - в основном процессе.
+    Задачи с ошибкой генерации повторяются запасным способом, ошибка
+    одной задачи не останавливает обработчик. Завершённые задачи
+    удаляются через 'PDF_JOB_RETENTION' секунд.
+    """
+
+    help = 'Обработчик очереди генерации PDF-файлов списков покупок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=2,
+            help='Количество процессов генерации.'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить задачи из очереди и завершиться.'
+        )
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        # Процессы пула запускаются заново, а не копией основного,
+        # чтобы не унаследовать его соединения с БД.
+        with ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup
+        ) as pool:
+            purged_at = None
+            while True:
+                if purged_at is None or time.monotonic() - purged_at >= (
+                    settings.PDF_JOB_PURGE_INTERVAL
+                ):
+                    purge_jobs()
+                    purged_at = time.monotonic()
+                requeue_stale_jobs()
+                jobs = claim_jobs(processes)
+                if jobs:
+                    self.run(pool, jobs)
+                    continue
+                if options['once']:
+                    break
+                time.sleep(settings.PDF_JOB_POLL_INTERVAL)
+
+    def run(self, pool, jobs):
+        rendering = []
+        for job in jobs:
+            try:
+                name, items = prepare_job(job)
+            except Exception as error:
+                fail_job(job, repr(error))
+                continue
+            if items is None:
+                finish_job(job, name)
+            else:
+                rendering.append(
+                    (job, name, pool.submit(render, items, job.renderer))
+                )
+        for job, name, future in rendering:
+            try:
+                content = future.result()
+            except PdfRenderError as error:
+                fail_job(job, str(error))
+                continue
+            except Exception as error:
+                if fall_back(job):
+                    self.stderr.write(
+                        f'Задача {job.pk}: {error!r}, повтор '
+                        f'способом {job.renderer}.'
+                    )
+                else:
+                    fail_job(job, repr(error))
+                continue
+            finish_job(job, name, content)
+        self.stdout.write(f'Выполнено задач: {len(jobs)}')
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from api.v1.services import rebuild_shopping_lists
+
+
+class Command(BaseCommand):
+    """Пересчитывает суммарные списки покупок по спискам рецептов."""
+
+    help = 'Пересчитывает таблицу суммарных списков покупок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, nargs='+', dest='users',
+            help='id пользователей (по умолчанию - все).'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        created = rebuild_shopping_lists(
+            options['users'], options['batch_size']
+        )
+        self.stdout.write(f'Создано строк списков покупок: {created}')
@@ -0,0 +1,155 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+
+from head.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                         ShoppingCart, Subscription, Tag, TagRecipe)
+
+from .v1 import services
+from .v1.caches import (FAVORITES_SCOPE, INGREDIENTS_SCOPE, POPULARITY_SCOPE,
+                        RECIPE_SCOPE, RECIPES_CONTENT_SCOPE, RECIPES_SCOPE,
+                        SHOPPING_CART_SCOPE, SUBSCRIPTIONS_SCOPE, TAGS_SCOPE,
+                        bump_version_on_commit)
+from .v1.search import delete_recipe_search_index, update_recipe_search_index
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    """Делает устаревшими закэшированные выборки и ответы с рецептом."""
+    bump_version_on_commit(RECIPES_SCOPE)
+    bump_version_on_commit(RECIPE_SCOPE.format(instance.pk))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, update_fields=None, **kwargs):
+    """Обновляет полнотекстовый индекс при изменении текста рецепта."""
+    if update_fields is not None and not {'name', 'text'} & set(update_fields):
+        return
+    update_recipe_search_index([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    delete_recipe_search_index([instance.pk])
+
+
+@receiver(post_save, sender=TagRecipe)
+@receiver(post_delete, sender=TagRecipe)
+def recipe_tag_changed(sender, instance, **kwargs):
+    bump_version_on_commit(RECIPES_SCOPE)
+    bump_version_on_commit(RECIPE_SCOPE.format(instance.recipe_id))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    bump_version_on_commit(RECIPES_SCOPE)
+    if not reverse:
+        bump_version_on_commit(RECIPE_SCOPE.format(instance.pk))
+
+
+@receiver(post_save, sender=IngredientRecipe)
+@receiver(post_delete, sender=IngredientRecipe)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    bump_version_on_commit(RECIPES_CONTENT_SCOPE)
+    bump_version_on_commit(RECIPE_SCOPE.format(instance.recipe_id))
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_ingredients_changed(sender, instance, action, reverse, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    bump_version_on_commit(RECIPES_CONTENT_SCOPE)
+    if not reverse:
+        bump_version_on_commit(RECIPE_SCOPE.format(instance.pk))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tags_changed(sender, **kwargs):
+    """Названия тегов входят и в представление рецептов."""
+    bump_version_on_commit(TAGS_SCOPE)
+    bump_version_on_commit(RECIPES_CONTENT_SCOPE)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredients_changed(sender, **kwargs):
+    """Названия ингредиентов входят и в представление рецептов."""
+    bump_version_on_commit(INGREDIENTS_SCOPE)
+    bump_version_on_commit(RECIPES_CONTENT_SCOPE)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def author_changed(sender, update_fields=None, **kwargs):
+    """Данные автора входят в представление рецептов."""
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    bump_version_on_commit(RECIPES_CONTENT_SCOPE)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def favorites_changed(sender, instance, **kwargs):
+    bump_version_on_commit(FAVORITES_SCOPE.format(instance.user_id))
+    bump_version_on_commit(POPULARITY_SCOPE)
+
+
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def shopping_cart_changed(sender, instance, **kwargs):
+    bump_version_on_commit(SHOPPING_CART_SCOPE.format(instance.user_id))
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def subscriptions_changed(sender, instance, **kwargs):
+    bump_version_on_commit(SUBSCRIPTIONS_SCOPE.format(instance.user_id))
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_added(sender, instance, created, **kwargs):
+    if created:
+        services.add_to_shopping_list(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def shopping_cart_removed(sender, instance, **kwargs):
+    services.remove_from_shopping_list(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_save, sender=IngredientRecipe)
+def remember_recipe_ingredient(sender, instance, **kwargs):
+    """Запоминает прежние значения строки для расчёта изменений."""
+    instance._previous = IngredientRecipe.objects.filter(
+        pk=instance.pk
+    ).values_list('recipe', 'ingredient', 'amount').first()
+
+
+@receiver(post_save, sender=IngredientRecipe)
+def recipe_ingredient_saved(sender, instance, **kwargs):
+    """
+    Пересчитывает списки покупок при сохранении строки отдельно,
+    например из админки. Массовые изменения из сериализатора рецепта
+    передают изменения в списки покупок напрямую.
+    """
+    previous = getattr(instance, '_previous', None)
+    if previous is not None:
+        recipe_id, ingredient_id, amount = previous
+        services.change_recipe_ingredients(recipe_id, {ingredient_id: -amount})
+    services.change_recipe_ingredients(
+        instance.recipe_id, {instance.ingredient_id: instance.amount}
+    )
+
+
+@receiver(post_delete, sender=IngredientRecipe)
+def recipe_ingredient_deleted(sender, instance, **kwargs):
+    services.change_recipe_ingredients(
+        instance.recipe_id, {instance.ingredient_id: -instance.amount}
+    )
@@ -1,3 +1,1527 @@
-# from django.test import TestCase
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from array import array
+from concurrent.futures import Future
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.db.models import Count, F
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework import generics
+from rest_framework.permissions import AllowAny
+from rest_framework.test import APIClient, APIRequestFactory
+
+from head.admin import RecipeAdmin
+from head.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                         ShoppingCart, ShoppingCartPdfJob, Subscription, Tag,
+                         TagRecipe)
+
+from .management.commands.pdf_worker import Command as PdfWorkerCommand
+from .v1 import cooking
+from .v1.caches import get_or_build
+from .v1.mixins import ConditionalGetMixin
+from .v1.pdfcache import FALLBACK_RENDERER, PdfRenderError, render
+from .v1.pdfjobs import (claim_jobs, create_job, fall_back, prepare_job,
+                         purge_jobs)
+from .v1.serializers import TagSerializer
+from .v1.services import rebuild_shopping_lists
+from .v1.throttles import CONCURRENCY_KEY, TokenBucketThrottle
+from .v1.views import RecipeViewSet
+
+User = get_user_model()
+
+
+class RecipeListQueriesTest(TestCase):
+    """
+    Проверяет, что список рецептов выполняется за фиксированное число
+    запросов к БД независимо от размера страницы.
+    """
+
+    # count, рецепты, теги, ингредиенты, авторы.
+    LIST_QUERIES = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@foodgram.ru', password='pass'
+        )
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {i}', color=f'#00000{i}', slug=f'tag{i}'
+            )
+            for i in range(2)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {i}', measurement_unit='г'
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def create_recipes(self, count):
+        for i in range(count):
+            author = User.objects.create_user(
+                username=f'author{Recipe.objects.count()}',
+                email=f'author{Recipe.objects.count()}@foodgram.ru',
+                password='pass'
+            )
+            recipe = Recipe.objects.create(
+                author=author,
+                name=f'Рецепт {i}',
+                image='recipes/images/test.png',
+                text='Описание',
+                cooking_time=10
+            )
+            for tag in self.tags:
+                TagRecipe.objects.create(tag=tag, recipe=recipe)
+            for ingredient in self.ingredients:
+                IngredientRecipe.objects.create(
+                    ingredient=ingredient, recipe=recipe, amount=5
+                )
+            Favorite.objects.create(user=self.user, recipe=recipe)
+            ShoppingCart.objects.create(user=self.user, recipe=recipe)
+            Subscription.objects.create(user=self.user, author=author)
+
+    def assert_list_queries(self, count):
+        with self.assertNumQueries(self.LIST_QUERIES):
+            response = self.client.get('/api/recipes/', {'limit': 100})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), count)
+        return response.data['results']
+
+    def test_anonymous_list_queries_do_not_depend_on_page_size(self):
+        self.create_recipes(2)
+        self.assert_list_queries(2)
+        self.create_recipes(10)
+        self.assert_list_queries(12)
+
+    def test_authenticated_list_queries_do_not_depend_on_page_size(self):
+        self.client.force_authenticate(self.user)
+        self.create_recipes(2)
+        self.assert_list_queries(2)
+        self.create_recipes(10)
+        results = self.assert_list_queries(12)
+        recipe = results[0]
+        self.assertTrue(recipe['is_favorited'])
+        self.assertTrue(recipe['is_in_shopping_cart'])
+        self.assertTrue(recipe['author']['is_subscribed'])
+        self.assertEqual(len(recipe['tags']), 2)
+        self.assertEqual(len(recipe['ingredients']), 3)
+
+
+class RecipeCursorPaginationTest(TestCase):
+    """Проверяет пагинацию рецептов и подписок по ключу."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@foodgram.ru', password='pass'
+        )
+        cls.subscriber = User.objects.create_user(
+            username='subscriber', email='subscriber@foodgram.ru',
+            password='pass'
+        )
+        for i in range(5):
+            Subscription.objects.create(
+                user=cls.subscriber,
+                author=User.objects.create_user(
+                    username=f'author{i}', email=f'author{i}@foodgram.ru',
+                    password='pass'
+                )
+            )
+        Subscription.objects.create(user=cls.subscriber, author=author)
+        # Подписки другого пользователя не попадают в выдачу.
+        Subscription.objects.create(user=author, author=cls.subscriber)
+        for i in range(5):
+            Recipe.objects.create(
+                author=author,
+                name=f'Рецепт {i}',
+                image='recipes/images/test.png',
+                text='Описание',
+                cooking_time=10
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursor_pages_cover_all_recipes(self):
+        client = APIClient()
+        response = client.get('/api/recipes/', {'cursor': '', 'limit': 2})
+        self.assertNotIn('count', response.data)
+        ids = [recipe['id'] for recipe in response.data['results']]
+        while response.data['next']:
+            response = client.get(response.data['next'])
+            ids += [recipe['id'] for recipe in response.data['results']]
+        self.assertEqual(
+            ids, list(Recipe.objects.values_list('id', flat=True))
+        )
+
+    def test_cursor_pages_cover_all_subscriptions(self):
+        client = APIClient()
+        client.force_authenticate(self.subscriber)
+        url = '/api/users/subscriptions/'
+        response = client.get(url, {'cursor': '', 'limit': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('count', response.data)
+        pages = [[author['id'] for author in response.data['results']]]
+        while response.data['next']:
+            response = client.get(response.data['next'])
+            pages.append(
+                [author['id'] for author in response.data['results']]
+            )
+        ids = sum(pages, [])
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(
+            ids, list(User.objects.filter(
+                subscriber__user=self.subscriber
+            ).order_by('-id').values_list('id', flat=True))
+        )
+        self.assertEqual(len(pages), 3)
+        response = client.get(response.data['previous'])
+        self.assertEqual(
+            [author['id'] for author in response.data['results']], pages[-2]
+        )
+
+    def test_page_number_response_shape_is_kept(self):
+        response = APIClient().get('/api/recipes/', {'page': 2, 'limit': 2})
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(len(response.data['results']), 2)
+
+
+class RecipeCountCacheTest(TestCase):
+    """Проверяет кэширование и сброс количества рецептов в выдаче."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@foodgram.ru', password='pass'
+        )
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.user,
+                name=f'Рецепт {i}',
+                image='recipes/images/test.png',
+                text='Описание',
+                cooking_time=10
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_count(self, **params):
+        return self.client.get('/api/recipes/', params).data['count']
+
+    def test_count_is_cached_per_filter(self):
+        self.assertEqual(self.get_count(), 3)
+        self.assertEqual(self.get_count(is_favorited=1), 0)
+        # Повторный запрос обходится без COUNT(*).
+        with self.assertNumQueries(RecipeListQueriesTest.LIST_QUERIES - 1):
+            self.assertEqual(self.get_count(), 3)
+
+    def test_writes_invalidate_count(self):
+        self.assertEqual(self.get_count(is_favorited=1), 0)
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        self.assertEqual(self.get_count(is_favorited=1), 1)
+        self.recipes[1].delete()
+        self.assertEqual(self.get_count(), 2)
+
+
+class RecipeResponseCacheTest(TestCase):
+    """Проверяет кэширование ответов анонимным пользователям."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@foodgram.ru', password='pass'
+        )
+        cls.ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author,
+            name='Рецепт',
+            image='recipes/images/test.png',
+            text='Описание',
+            cooking_time=10
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def assert_cached(self, url):
+        first = self.client.get(url).data
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).data, first)
+        return first
+
+    def test_list_and_detail_are_cached(self):
+        self.assert_cached('/api/recipes/')
+        self.assert_cached(f'/api/recipes/{self.recipe.id}/')
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': tempfile.mkdtemp()
+    }})
+    def test_file_based_backend(self):
+        self.assert_cached('/api/recipes/')
+
+    def test_related_rows_invalidate_responses(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        self.assert_cached(url)
+        self.assert_cached('/api/recipes/')
+        IngredientRecipe.objects.create(
+            ingredient=self.ingredient, recipe=self.recipe, amount=1
+        )
+        self.assertEqual(len(self.client.get(url).data['ingredients']), 1)
+        self.author.first_name = 'Автор'
+        self.author.save()
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(
+            response.data['results'][0]['author']['first_name'], 'Автор'
+        )
+
+
+class SingleFlightTest(SimpleTestCase):
+    """Проверяет, что значение строится один раз при конкурентном промахе."""
+
+    def test_concurrent_miss_builds_once(self):
+        cache.clear()
+        calls = []
+
+        def build():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(get_or_build('key', build, 60))
+            )
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 8)
+
+
+class ConditionalGetTest(TestCase):
+    """Проверяет ответы на условные запросы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@foodgram.ru', password='pass'
+        )
+        cls.tag = Tag.objects.create(name='Тег', color='#000000', slug='tag')
+        cls.recipe = Recipe.objects.create(
+            author=cls.author,
+            name='Рецепт',
+            image='recipes/images/test.png',
+            text='Описание',
+            cooking_time=10
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def assert_not_modified(self, url):
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        return etag
+
+    def test_not_modified(self):
+        for url in (
+            '/api/recipes/',
+            f'/api/recipes/{self.recipe.id}/',
+            '/api/tags/',
+            '/api/ingredients/'
+        ):
+            with self.subTest(url=url):
+                self.assert_not_modified(url)
+
+    def test_changes_update_etag(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        etag = self.assert_not_modified(url)
+        updated_at = self.recipe.updated_at
+        TagRecipe.objects.create(tag=self.tag, recipe=self.recipe)
+        self.recipe.refresh_from_db()
+        self.assertGreater(self.recipe.updated_at, updated_at)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_view_without_scopes(self):
+        class TagListView(ConditionalGetMixin, generics.ListAPIView):
+            queryset = Tag.objects.all()
+            serializer_class = TagSerializer
+            permission_classes = (AllowAny,)
+
+        response = TagListView.as_view()(APIRequestFactory().get('/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+
+class CatalogResponseCacheTest(TestCase):
+    """Проверяет хранение готовых ответов справочников в памяти процесса."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@foodgram.ru', password='pass'
+        )
+        Tag.objects.create(name='Тег', color='#000000', slug='tag')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_rendered_response_follows_version(self):
+        first = self.client.get('/api/tags/')
+        self.assertIn('public', first['Cache-Control'])
+        self.assertIn('must-revalidate', first['Cache-Control'])
+        self.assertNotIn('Authorization', first.get('Vary', ''))
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/tags/')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        Tag.objects.create(name='Новый тег', color='#FFFFFF', slug='new')
+        self.assertEqual(len(self.client.get('/api/tags/').json()), 2)
+
+
+class SparseFieldsTest(TestCase):
+    """Проверяет ограничение набора полей параметрами 'fields' и 'omit'."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='author', email='author@foodgram.ru', password='pass'
+        )
+        Recipe.objects.create(
+            author=cls.user,
+            name='Рецепт',
+            image='recipes/images/test.png',
+            text='Описание',
+            cooking_time=10
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_card_fields_skip_related_queries(self):
+        # count и рецепты без подзапросов и дополнительных выборок.
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                '/api/recipes/', {'fields': 'id,name,image,cooking_time'}
+            )
+        self.assertEqual(
+            set(response.data['results'][0]),
+            {'id', 'name', 'image', 'cooking_time'}
+        )
+
+    def test_omit_keeps_nested_fields(self):
+        response = self.client.get(
+            '/api/recipes/', {'omit': 'text,ingredients'}
+        )
+        recipe = response.data['results'][0]
+        self.assertNotIn('text', recipe)
+        self.assertNotIn('ingredients', recipe)
+        self.assertIn('is_subscribed', recipe['author'])
+
+    def test_user_fields(self):
+        response = self.client.get('/api/users/me/', {'fields': 'id,email'})
+        self.assertEqual(set(response.data), {'id', 'email'})
+
+
+# Картинка 1x1 в формате GIF.
+GIF_1X1 = 'R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7'
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class RecipeWriteQueriesTest(TestCase):
+    """
+    Проверяет, что создание рецепта выполняется за фиксированное число
+    запросов к БД независимо от количества ингредиентов.
+    """
+
+    # Проверка тега, проверка ингредиентов, точка сохранения транзакции
+    # и её освобождение, рецепт, полнотекстовый индекс, ингредиенты, теги,
+    # а также представление рецепта: теги, ингредиенты, флаги
+    # пользователя, подписка на автора.
+    CREATE_QUERIES = 13
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='author', email='author@foodgram.ru', password='pass'
+        )
+        cls.tag = Tag.objects.create(name='Тег', color='#000000', slug='tag')
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(30)
+        )
+        cls.ingredients = list(Ingredient.objects.all())
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_payload(self, ingredients):
+        return {
+            'name': 'Рецепт',
+            'text': 'Описание',
+            'cooking_time': 10,
+            'image': f'data:image/gif;base64,{GIF_1X1}',
+            'tags': [self.tag.id],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 5}
+                for ingredient in ingredients
+            ]
+        }
+
+    def test_create_queries_do_not_depend_on_ingredients(self):
+        for count in (3, 30):
+            with self.subTest(count=count):
+                with self.assertNumQueries(self.CREATE_QUERIES):
+                    response = self.client.post(
+                        '/api/recipes/',
+                        self.get_payload(self.ingredients[:count]),
+                        format='json'
+                    )
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(len(response.data['ingredients']), count)
+
+    def test_unknown_ingredients_are_reported_together(self):
+        payload = self.get_payload(self.ingredients[:1])
+        payload['ingredients'] += [
+            {'id': 1000, 'amount': 1}, {'id': 1001, 'amount': 1}
+        ]
+        response = self.client.post('/api/recipes/', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('1000, 1001', str(response.data['ingredients']))
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_update_changes_only_edited_rows(self):
+        response = self.client.post(
+            '/api/recipes/',
+            self.get_payload(self.ingredients[:3]),
+            format='json'
+        )
+        recipe_id = response.data['id']
+        rows = dict(IngredientRecipe.objects.filter(
+            recipe_id=recipe_id
+        ).values_list('ingredient_id', 'id'))
+        payload = self.get_payload(self.ingredients[1:4])
+        payload['ingredients'][0]['amount'] = 7
+        del payload['image']
+        response = self.client.patch(
+            f'/api/recipes/{recipe_id}/', payload, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        updated = {
+            row.ingredient_id: row
+            for row in IngredientRecipe.objects.filter(recipe_id=recipe_id)
+        }
+        self.assertEqual(
+            set(updated), {item.id for item in self.ingredients[1:4]}
+        )
+        for ingredient in self.ingredients[1:3]:
+            self.assertEqual(updated[ingredient.id].id, rows[ingredient.id])
+        self.assertEqual(updated[self.ingredients[1].id].amount, 7)
+        self.assertEqual(updated[self.ingredients[2].id].amount, 5)
+
+    def test_update_keeps_favorites_count(self):
+        response = self.client.post(
+            '/api/recipes/',
+            self.get_payload(self.ingredients[:3]),
+            format='json'
+        )
+        recipe_id = response.data['id']
+        get_object = RecipeViewSet.get_object
+
+        def get_object_and_favorite(view):
+            recipe = get_object(view)
+            Favorite.objects.create(user=self.user, recipe=recipe)
+            return recipe
+
+        payload = self.get_payload(self.ingredients[:3])
+        del payload['image']
+        with mock.patch.object(
+            RecipeViewSet, 'get_object', get_object_and_favorite
+        ):
+            response = self.client.patch(
+                f'/api/recipes/{recipe_id}/', payload, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        recipe = Recipe.objects.get(pk=recipe_id)
+        self.assertEqual(recipe.favorites_count, 1)
+        # Так же сохраняет изменённый рецепт админка.
+        Recipe.objects.filter(pk=recipe_id).update(
+            favorites_count=5, tag_mask=F('tag_mask') * 2
+        )
+        recipe.name = 'Новое название'
+        RecipeAdmin(Recipe, admin.site).save_model(None, recipe, None, True)
+        saved = Recipe.objects.get(pk=recipe_id)
+        self.assertEqual(
+            (saved.name, saved.favorites_count, saved.tag_mask),
+            ('Новое название', 5, recipe.tag_mask * 2)
+        )
+
+    def test_plain_save_clones_and_restores_recipe(self):
+        response = self.client.post(
+            '/api/recipes/',
+            self.get_payload(self.ingredients[:3]),
+            format='json'
+        )
+        recipe = Recipe.objects.get(pk=response.data['id'])
+        recipe.pk = None
+        recipe.save()
+        self.assertEqual(Recipe.objects.count(), 2)
+        Recipe.objects.filter(pk=recipe.pk).delete()
+        recipe.save()
+        self.assertTrue(Recipe.objects.filter(pk=recipe.pk).exists())
+
+
+class ShoppingListTest(TestCase):
+    """Проверяет суммирование ингредиентов списка покупок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='buyer', email='buyer@foodgram.ru', password='pass'
+        )
+        salt = Ingredient.objects.create(name='Соль', measurement_unit='г')
+        sugar = Ingredient.objects.create(name='Сахар', measurement_unit='г')
+        for amounts in ({salt: 5, sugar: 10}, {salt: 7}, {}):
+            recipe = Recipe.objects.create(
+                author=cls.user,
+                name='Рецепт',
+                image='recipes/images/test.png',
+                text='Описание',
+                cooking_time=10
+            )
+            IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(
+                    recipe=recipe, ingredient=ingredient, amount=amount
+                )
+                for ingredient, amount in amounts.items()
+            )
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        cls.salt, cls.sugar = salt, sugar
+        cls.expected = [
+            {'id': sugar.id, 'name': 'Сахар', 'measurement_unit': 'г',
+             'amount': 10},
+            {'id': salt.id, 'name': 'Соль', 'measurement_unit': 'г',
+             'amount': 12},
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_shopping_list(self):
+        response = self.client.get('/api/recipes/shopping_list/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_shopping_list(self):
+        self.assertEqual(self.get_shopping_list(), self.expected)
+
+    def test_shopping_list_follows_changes(self):
+        recipe = Recipe.objects.filter(ingredients=self.sugar).get()
+        row = IngredientRecipe.objects.get(
+            recipe=recipe, ingredient=self.salt
+        )
+        row.amount = 1
+        row.save()
+        ShoppingCart.objects.get(
+            recipe__ingredients=self.salt, recipe__ingredientrecipe__amount=7
+        ).delete()
+        self.assertEqual(self.get_shopping_list(), [
+            dict(self.expected[0]), dict(self.expected[1], amount=1)
+        ])
+        rebuild_shopping_lists()
+        self.assertEqual(self.get_shopping_list(), [
+            dict(self.expected[0]), dict(self.expected[1], amount=1)
+        ])
+        IngredientRecipe.objects.filter(recipe=recipe).delete()
+        self.assertEqual(self.get_shopping_list(), [])
+
+    def download(self, export_format):
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/', {'format': export_format}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_download_streams_text_formats(self):
+        self.assertEqual(
+            self.download('txt'), 'Сахар (г) - 10\nСоль (г) - 12\n'
+        )
+        self.assertEqual(
+            self.download('csv'),
+            'Название,Ед. изм.,Количество\r\nСахар,г,10\r\nСоль,г,12\r\n'
+        )
+        self.assertEqual(json.loads(self.download('json')), self.expected)
+        ShoppingCart.objects.filter(user=self.user).delete()
+        self.assertEqual(json.loads(self.download('json')), [])
+
+    def test_download_rejects_unknown_format(self):
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/', {'format': 'xml'}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('format', response.json())
+
+
+class InlinePool:
+    """Пул, выполняющий задачи сразу в текущем процессе."""
+
+    def submit(self, function, *args):
+        future = Future()
+        try:
+            future.set_result(function(*args))
+        except Exception as error:
+            future.set_exception(error)
+        return future
+
+
+class ShoppingCartPdfCacheTest(TestCase):
+    """Проверяет хранилище сгенерированных PDF-файлов списка покупок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='buyer', email='buyer@foodgram.ru', password='pass'
+        )
+        cls.ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.user,
+            name='Рецепт',
+            image='recipes/images/test.png',
+            text='Описание',
+            cooking_time=10
+        )
+        IngredientRecipe.objects.create(
+            recipe=cls.recipe, ingredient=cls.ingredient, amount=5
+        )
+        ShoppingCart.objects.create(user=cls.user, recipe=cls.recipe)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.root = tempfile.mkdtemp()
+
+    def download(self, **params):
+        with mock.patch(
+            'api.v1.pdfcache.render', wraps=render
+        ) as rendered:
+            response = self.client.get(
+                '/api/recipes/download_shopping_cart/', params
+            )
+        self.assertEqual(response.status_code, 200)
+        return response, rendered.call_count
+
+    def test_unchanged_cart_is_rendered_once(self):
+        with override_settings(PDF_CACHE_ROOT=self.root):
+            first, rendered = self.download()
+            self.assertEqual(rendered, 1)
+            second, rendered = self.download()
+            self.assertEqual(rendered, 0)
+            self.assertEqual(b''.join(second.streaming_content), first.content)
+            IngredientRecipe.objects.filter(recipe=self.recipe).update(
+                amount=6
+            )
+            rebuild_shopping_lists()
+            self.assertEqual(self.download()[1], 1)
+
+    def test_renderers(self):
+        with override_settings(PDF_CACHE_ROOT=self.root):
+            for renderer in ('reportlab', 'xhtml2pdf'):
+                with self.subTest(renderer=renderer):
+                    response, rendered = self.download(renderer=renderer)
+                    self.assertEqual(rendered, 1)
+                    self.assertTrue(response.content.startswith(b'%PDF'))
+            response = self.client.get(
+                '/api/recipes/download_shopping_cart/', {'renderer': 'tex'}
+            )
+            self.assertEqual(response.status_code, 400)
+
+    def test_renderer_error_falls_back(self):
+        with override_settings(PDF_CACHE_ROOT=self.root), mock.patch(
+            'api.v1.reportlab2pdf.render_shopping_list',
+            side_effect=OSError('Шрифт не найден')
+        ):
+            response, rendered = self.download(renderer='reportlab')
+        self.assertEqual(rendered, 2)
+        self.assertTrue(response.content.startswith(b'%PDF'))
+        job = create_job(self.user, 'reportlab')
+        self.assertTrue(fall_back(job))
+        job.refresh_from_db()
+        self.assertEqual(
+            (job.renderer, job.status),
+            (FALLBACK_RENDERER, ShoppingCartPdfJob.PENDING)
+        )
+        self.assertFalse(fall_back(job))
+
+    def test_both_renderers_fail(self):
+        job = create_job(self.user, 'reportlab')
+        with override_settings(PDF_CACHE_ROOT=self.root), mock.patch(
+            'api.v1.reportlab2pdf.render_shopping_list',
+            side_effect=OSError('Шрифт не найден')
+        ), mock.patch('api.v1.pdfcache.render_pdf', return_value=None):
+            response = self.client.get(
+                '/api/recipes/download_shopping_cart/',
+                {'renderer': 'reportlab'}
+            )
+            # Процессы пула не видят подмен, поэтому генерация
+            # выполняется в текущем процессе.
+            worker = PdfWorkerCommand(
+                stdout=io.StringIO(), stderr=io.StringIO()
+            )
+            for _ in range(2):
+                worker.run(InlinePool(), claim_jobs(1))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.data['detail'].code, 'pdf_render_error')
+        job.refresh_from_db()
+        self.assertEqual(
+            (job.renderer, job.status, job.error),
+            (FALLBACK_RENDERER, ShoppingCartPdfJob.FAILED,
+             str(PdfRenderError.default_detail))
+        )
+
+    def test_worker_survives_job_errors_and_purges_jobs(self):
+        broken, job = create_job(self.user), create_job(self.user)
+
+        def prepare(claimed):
+            if claimed.pk == broken.pk:
+                raise DatabaseError('Ошибка БД')
+            return prepare_job(claimed)
+
+        with override_settings(PDF_CACHE_ROOT=self.root), mock.patch(
+            'api.management.commands.pdf_worker.prepare_job',
+            side_effect=prepare
+        ):
+            call_command(
+                'pdf_worker', once=True, processes=2, stdout=io.StringIO()
+            )
+        broken.refresh_from_db()
+        job.refresh_from_db()
+        self.assertEqual(broken.status, ShoppingCartPdfJob.FAILED)
+        self.assertIn('Ошибка БД', broken.error)
+        self.assertEqual(job.status, ShoppingCartPdfJob.DONE)
+        self.assertEqual(purge_jobs(), 0)
+        ShoppingCartPdfJob.objects.filter(pk=broken.pk).update(
+            updated_at=timezone.now() - timedelta(
+                seconds=settings.PDF_JOB_RETENTION + 1
+            )
+        )
+        self.assertEqual(purge_jobs(), 1)
+        self.assertTrue(ShoppingCartPdfJob.objects.filter(pk=job.pk).exists())
+
+    def test_accel_redirect_and_eviction(self):
+        with override_settings(
+            PDF_CACHE_ROOT=self.root,
+            PDF_CACHE_ACCEL_REDIRECT=True,
+            PDF_CACHE_MAX_SIZE=1
+        ):
+            response = self.download()[0]
+            self.assertTrue(
+                response['X-Accel-Redirect'].startswith(
+                    '/protected/shopping_carts/'
+                )
+            )
+            ShoppingCart.objects.all().delete()
+            self.download()
+            self.assertEqual(len(os.listdir(self.root)), 1)
+
+    def test_async_job(self):
+        with override_settings(PDF_CACHE_ROOT=self.root):
+            response = self.client.post('/api/recipes/download_shopping_cart/')
+            self.assertEqual(response.status_code, 202)
+            job_url = response['Location']
+            self.assertEqual(self.client.get(job_url).status_code, 202)
+            call_command(
+                'pdf_worker', once=True, processes=1, stdout=io.StringIO()
+            )
+            response = self.client.get(job_url)
+            self.assertEqual(response.status_code, 302)
+            response = self.client.get(response['Location'])
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(
+                b''.join(response.streaming_content).startswith(b'%PDF')
+            )
+            other = User.objects.create_user(
+                username='other', email='other@foodgram.ru', password='pass'
+            )
+            self.client.force_authenticate(other)
+            self.assertEqual(self.client.get(job_url).status_code, 404)
+
+
+class ThrottleTest(TestCase):
+    """Проверяет ограничение частоты и числа одновременных запросов."""
+
+    URL = '/api/recipes/download_shopping_cart/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='buyer', email='buyer@foodgram.ru', password='pass'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def download(self):
+        return self.client.get(self.URL, {'format': 'txt'})
+
+    @override_settings(CONCURRENCY_LIMITS={'download_shopping_cart': 1})
+    def test_concurrency_limit(self):
+        key = CONCURRENCY_KEY.format('download_shopping_cart', 0)
+        cache.set(key, 1)
+        response = self.download()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(cache.get(key), 1)
+        cache.delete(key)
+        response = self.download()
+        self.assertEqual(response.status_code, 200)
+        # Место потокового ответа занято, пока ответ передаётся.
+        self.assertEqual(cache.get(key), 1)
+        b''.join(response.streaming_content)
+        self.assertIsNone(cache.get(key))
+
+    @override_settings(CONCURRENCY_LIMITS={'download_shopping_cart': 2})
+    def test_concurrency_slot_expiry(self):
+        first = CONCURRENCY_KEY.format('download_shopping_cart', 0)
+        second = CONCURRENCY_KEY.format('download_shopping_cart', 1)
+        cache.set(first, 1)
+        cache.set(second, 1)
+        self.assertEqual(self.download().status_code, 429)
+        # Место запроса, не освободившего его, истекает само по себе,
+        # и освобождение других мест не превышает предел.
+        cache.delete(first)
+        response = self.download()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.download().status_code, 429)
+        b''.join(response.streaming_content)
+        cache.delete(second)
+        responses = [self.download(), self.download()]
+        self.assertEqual(
+            [response.status_code for response in responses], [200, 200]
+        )
+        self.assertEqual(self.download().status_code, 429)
+        for response in responses:
+            b''.join(response.streaming_content)
+        self.assertIsNone(cache.get(first))
+        self.assertIsNone(cache.get(second))
+
+    @override_settings(REST_FRAMEWORK=dict(
+        settings.REST_FRAMEWORK,
+        DEFAULT_THROTTLE_RATES={'download_shopping_cart': '2/min'}
+    ))
+    def test_token_bucket(self):
+        self.assertEqual(self.download().status_code, 200)
+        self.assertEqual(self.download().status_code, 200)
+        response = self.download()
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(0 < int(response['Retry-After']) <= 30)
+        # Список рецептов в другой области и не ограничен.
+        self.assertEqual(self.client.get('/api/recipes/').status_code, 200)
+
+    @override_settings(REST_FRAMEWORK=dict(
+        settings.REST_FRAMEWORK,
+        DEFAULT_THROTTLE_RATES={'download_shopping_cart': '1/min'}
+    ))
+    def test_token_bucket_is_atomic(self):
+        view = mock.Mock(throttle_scope='download_shopping_cart')
+        request = mock.Mock(user=self.user)
+        barrier = threading.Barrier(5)
+
+        def slow_get(*args):
+            # Расширяет окно между чтением и записью корзины.
+            try:
+                return cache.get(*args)
+            finally:
+                time.sleep(0.01)
+
+        def allow(results):
+            throttle = TokenBucketThrottle()
+            throttle.cache = mock.Mock(get=slow_get, set=cache.set)
+            barrier.wait()
+            results.append(throttle.allow_request(request, view))
+
+        results = []
+        threads = [
+            threading.Thread(target=allow, args=(results,)) for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(results), [False] * 4 + [True])
+
+
+class IngredientSearchTest(TestCase):
+    """Проверяет поиск ингредиентов по индексу в памяти процесса."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in (
+                'абрикосовый джем', 'джем', 'джем вишнёвый', 'Джемовый соус',
+                'соль'
+            )
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def search(self, name):
+        response = self.client.get('/api/ingredients/', {'name': name})
+        self.assertEqual(response.status_code, 200)
+        return [ingredient['name'] for ingredient in response.json()]
+
+    def test_prefix_matches_go_first(self):
+        expected = [
+            'джем', 'джем вишнёвый', 'Джемовый соус', 'абрикосовый джем'
+        ]
+        self.assertEqual(self.search('Дже'), expected)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.search('Дже'), expected)
+        with override_settings(INGREDIENTS_SEARCH_LIMIT=2):
+            self.assertEqual(self.search('дже'), expected[:2])
+        self.assertEqual(len(self.search('')), 5)
+
+    def test_index_follows_changes(self):
+        self.assertEqual(self.search('соль'), ['соль'])
+        Ingredient.objects.filter(name='соль').get().delete()
+        Ingredient.objects.create(name='морская соль', measurement_unit='г')
+        self.assertEqual(self.search('соль'), ['морская соль'])
+
+    def test_fuzzy_search_tolerates_typos(self):
+        response = self.client.get(
+            '/api/ingredients/', {'name': 'абрикосовй джем', 'fuzzy': 1}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['name'], 'абрикосовый джем')
+        self.assertEqual(self.search('абрикосовй джем'), [])
+
+
+class LoadIngredientsTest(TestCase):
+    """Проверяет загрузку справочника ингредиентов из файлов."""
+
+    def write(self, suffix, content):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            file.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def load(self, path, **options):
+        call_command('load_ingredients', path, stdout=io.StringIO(), **options)
+        return sorted(
+            Ingredient.objects.values_list('name', 'measurement_unit')
+        )
+
+    def test_csv_and_json_are_normalized_and_deduplicated(self):
+        Ingredient.objects.create(name='соль', measurement_unit='г')
+        csv_path = self.write(
+            '.csv', 'соль,г\n  сахар   песок ,г\nСахар песок,Г\nсахар,ч. л.\n'
+        )
+        expected = [
+            ('сахар', 'ч. л.'), ('сахар песок', 'г'), ('соль', 'г')
+        ]
+        self.assertEqual(self.load(csv_path, batch_size=1), expected)
+        json_path = self.write('.json', json.dumps(
+            [
+                {'name': 'Буррата', 'measurement_unit': 'г'},
+                {'name': 'соль', 'measurement_unit': 'г'},
+            ] + [
+                {'name': f'специя {i}', 'measurement_unit': 'г'}
+                for i in range(3000)
+            ],
+            ensure_ascii=False
+        ))
+        ingredients = self.load(json_path)
+        self.assertEqual(len(ingredients), 3004)
+        self.assertIn(('Буррата', 'г'), ingredients)
+
+
+class GenerateDataTest(TestCase):
+    """Проверяет создание синтетических данных."""
+
+    def test_generate_data(self):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(20)
+        )
+        with override_settings(MEDIA_ROOT=tempfile.mkdtemp()):
+            call_command(
+                'generate_data', users=5, recipes=30, tags=4, batch_size=7,
+                stdout=io.StringIO()
+            )
+        self.assertEqual(User.objects.count(), 5)
+        self.assertEqual(Recipe.objects.count(), 30)
+        self.assertEqual(Tag.objects.count(), 4)
+        self.assertFalse(Recipe.objects.filter(tags__isnull=True).exists())
+        self.assertFalse(
+            Recipe.objects.filter(ingredients__isnull=True).exists()
+        )
+        self.assertTrue(Favorite.objects.exists())
+        self.assertFalse(Recipe.objects.annotate(
+            favorites=Count('lover')
+        ).exclude(favorites_count=F('favorites')).exists())
+        user = User.objects.create_user(
+            username='new', email='new@foodgram.ru', password='pass'
+        )
+        self.assertGreater(user.pk, 5)
+
+
+class RecipeTagFilterTest(TestCase):
+    """Проверяет фильтрацию рецептов по маске тегов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@foodgram.ru', password='pass'
+        )
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {i}', color=f'#00000{i}', slug=f'tag{i}'
+            )
+            for i in range(3)
+        ]
+        cls.recipes = []
+        for tags in ((0, 1), (1,), (2,), ()):
+            recipe = Recipe.objects.create(
+                author=cls.author,
+                name='Рецепт',
+                image='recipes/images/test.png',
+                text='Описание',
+                cooking_time=10
+            )
+            for i in tags:
+                TagRecipe.objects.create(tag=cls.tags[i], recipe=recipe)
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def filter(self, *slugs):
+        response = self.client.get('/api/recipes/', {'tags': slugs})
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def ids(self, *numbers):
+        return [self.recipes[number].id for number in reversed(numbers)]
+
+    def test_any_of_tags_without_duplicates(self):
+        self.assertEqual(self.filter('tag0', 'tag1'), self.ids(0, 1))
+        self.assertEqual(self.filter('tag1', 'tag2'), self.ids(0, 1, 2))
+        self.assertEqual(len(self.filter()), 4)
+
+    def test_mask_follows_tag_changes(self):
+        recipe = self.recipes[3]
+        recipe.tags.add(self.tags[2])
+        self.assertEqual(self.filter('tag2'), self.ids(2, 3))
+        TagRecipe.objects.filter(recipe=self.recipes[2]).delete()
+        self.assertEqual(self.filter('tag2'), self.ids(3))
+        self.tags[1].recipe_set.clear()
+        self.assertEqual(self.filter('tag1'), [])
+        self.assertEqual(self.filter('tag0'), self.ids(0))
+        self.tags[0].delete()
+        self.recipes[0].refresh_from_db()
+        self.assertEqual(self.recipes[0].tag_mask, 0)
+
+
+class RecipeSearchTest(TestCase):
+    """Проверяет полнотекстовый поиск рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.other = (
+            User.objects.create_user(
+                username=name, email=f'{name}@foodgram.ru', password='pass'
+            )
+            for name in ('author', 'other')
+        )
+        cls.recipes = [
+            Recipe.objects.create(
+                author=author,
+                name=name,
+                image='recipes/images/test.png',
+                text=text,
+                cooking_time=10
+            )
+            for author, name, text in (
+                (cls.author, 'Борщ', 'Свёкла, капуста и картофель.'),
+                (cls.author, 'Пампушки', 'Подавать к борщу.'),
+                (cls.other, 'Щи', 'Капуста и картофель.'),
+                (cls.other, 'Борщ зелёный', 'Щавель и яйцо.'),
+            )
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def search(self, query, **params):
+        response = self.client.get(
+            '/api/recipes/', {'search': query, **params}
+        )
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def ids(self, *numbers):
+        return [self.recipes[number].id for number in numbers]
+
+    def test_ranked_by_relevance(self):
+        found = self.search('борщ')
+        self.assertEqual(set(found), set(self.ids(0, 1, 3)))
+        self.assertEqual(found[-1], self.recipes[1].id)
+        self.assertEqual(self.search('капуста картофель'), self.ids(2, 0))
+        self.assertEqual(self.search('ананас'), [])
+        self.assertEqual(self.search('"*'), [])
+
+    def test_combines_with_filters_and_pagination(self):
+        self.assertEqual(
+            self.search('борщ', author=self.other.id), self.ids(3)
+        )
+        response = self.client.get(
+            '/api/recipes/', {'search': 'борщ', 'limit': 2}
+        )
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_index_follows_changes(self):
+        recipe = Recipe.objects.get(pk=self.recipes[2].pk)
+        recipe.name = 'Щи с ананасом'
+        recipe.save()
+        self.assertEqual(self.search('ананас'), self.ids(2))
+        recipe.delete()
+        self.assertEqual(self.search('ананас'), [])
+
+
+class RecipeOrderingTest(TestCase):
+    """
+    Проверяет сортировки списка рецептов, фильтр по времени
+    приготовления и пагинацию по ключу в каждой сортировке.
+    """
+
+    COOKING_TIMES = (30, 10, 20, 10, 30, 10, 5)
+    FAVORITES = (0, 2, 1, 2, 0, 1, 2)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(
+                username=f'user{i}', email=f'user{i}@foodgram.ru',
+                password='pass'
+            )
+            for i in range(3)
+        ]
+        cls.recipes = []
+        for cooking_time, favorites in zip(
+            cls.COOKING_TIMES, cls.FAVORITES
+        ):
+            recipe = Recipe.objects.create(
+                author=cls.users[0],
+                name='Рецепт',
+                image='recipes/images/test.png',
+                text='Описание',
+                cooking_time=cooking_time
+            )
+            for user in cls.users[:favorites]:
+                Favorite.objects.create(user=user, recipe=recipe)
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def list(self, **params):
+        response = self.client.get('/api/recipes/', params)
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def expected(self, key, reverse):
+        recipes = sorted(
+            Recipe.objects.all(),
+            key=lambda recipe: (key(recipe), recipe.id),
+            reverse=reverse
+        )
+        return [recipe.id for recipe in recipes]
+
+    def test_orderings(self):
+        self.assertEqual(
+            self.list(ordering='popular', limit=10),
+            self.expected(lambda recipe: recipe.favorites_count, True)
+        )
+        self.assertEqual(
+            self.list(ordering='quick', limit=10),
+            self.expected(lambda recipe: recipe.cooking_time, False)
+        )
+        self.assertEqual(
+            self.list(ordering='new', limit=10), self.list(limit=10)
+        )
+        response = self.client.get('/api/recipes/', {'ordering': 'name'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cooking_time_range(self):
+        found = self.list(
+            cooking_time__gte=10, cooking_time__lte=20, ordering='quick'
+        )
+        self.assertEqual(
+            [Recipe.objects.get(pk=pk).cooking_time for pk in found],
+            [10, 10, 10, 20]
+        )
+
+    def test_cursor_pages_follow_ordering(self):
+        for ordering in ('popular', 'quick', 'new'):
+            expected = self.list(ordering=ordering, limit=10)
+            response = self.client.get(
+                '/api/recipes/',
+                {'ordering': ordering, 'cursor': '', 'limit': 2}
+            )
+            pages = [[recipe['id'] for recipe in response.data['results']]]
+            while response.data['next']:
+                response = self.client.get(response.data['next'])
+                pages.append(
+                    [recipe['id'] for recipe in response.data['results']]
+                )
+            self.assertEqual(sum(pages, []), expected)
+            response = self.client.get(response.data['previous'])
+            self.assertEqual(
+                [recipe['id'] for recipe in response.data['results']],
+                pages[-2]
+            )
+
+    def test_invalid_cursor(self):
+        response = self.client.get(
+            '/api/recipes/', {'ordering': 'quick', 'cursor': 'cD0x'}
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_favorites_count_follows_favorites(self):
+        recipe = self.recipes[0]
+        self.assertNotEqual(self.list(ordering='popular')[0], recipe.id)
+        for user in self.users:
+            Favorite.objects.create(user=user, recipe=recipe)
+        self.assertEqual(self.list(ordering='popular')[0], recipe.id)
+        Favorite.objects.filter(recipe=recipe).delete()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 0)
+        self.assertEqual(
+            list(Recipe.objects.values_list('favorites_count', flat=True)),
+            list(reversed(self.FAVORITES))
+        )
+
+
+class CookingTest(TestCase):
+    """Проверяет подбор рецептов по имеющимся ингредиентам."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@foodgram.ru', password='pass'
+        )
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {i}', measurement_unit='г'
+            )
+            for i in range(4)
+        ]
+        cls.recipes = []
+        for numbers in ((0, 1), (0, 1, 2, 3), (2,)):
+            recipe = Recipe.objects.create(
+                author=cls.author,
+                name='Рецепт',
+                image='recipes/images/test.png',
+                text='Описание',
+                cooking_time=10
+            )
+            IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(
+                    recipe=recipe, ingredient=cls.ingredients[i], amount=1
+                )
+                for i in numbers
+            )
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        cache.clear()
+        for name in ('_cooking_index', '_rebuilding'):
+            patcher = mock.patch.object(cooking, name, None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = APIClient()
+
+    def cook(self, *numbers, **params):
+        ids = ','.join(str(self.ingredients[i].id) for i in numbers)
+        response = self.client.get(
+            '/api/recipes/cook/', {'ingredients': ids, **params}
+        )
+        self.assertEqual(response.status_code, 200)
+        numbers = {recipe.id: i for i, recipe in enumerate(self.recipes)}
+        return [
+            (numbers[recipe['id']], recipe['coverage'])
+            for recipe in response.data
+        ]
+
+    def test_ranked_by_coverage(self):
+        self.assertEqual(self.cook(0, 1), [(0, 1.0), (1, 0.5)])
+        self.assertEqual(self.cook(2), [(2, 1.0), (1, 0.25)])
+        self.assertEqual(self.cook(0, 1, min_coverage=0.6), [(0, 1.0)])
+        self.assertEqual(self.cook(0, 1, limit=1), [(0, 1.0)])
+        for params in (
+            {}, {'ingredients': 'соль'}, {'ingredients': '1', 'limit': 0}
+        ):
+            response = self.client.get('/api/recipes/cook/', params)
+            self.assertEqual(response.status_code, 400)
+
+    def test_index_follows_recipe_changes(self):
+        self.assertEqual(self.cook(3), [(1, 0.25)])
+        IngredientRecipe.objects.create(
+            recipe=self.recipes[2], ingredient=self.ingredients[3], amount=1
+        )
+        self.assertEqual(self.cook(3), [(2, 0.5), (1, 0.25)])
+        self.assertIn(self.recipes[2].id, cooking._cooking_index.changed)
+        Recipe.objects.filter(pk=self.recipes[1].pk).delete()
+        self.assertEqual(self.cook(3), [(2, 0.5)])
+
+    def test_deleted_recipes_are_refilled(self):
+        self.assertEqual(self.cook(0, 1, limit=1), [(0, 1.0)])
+        Recipe.objects.filter(pk=self.recipes[0].pk).delete()
+        self.assertEqual(self.cook(0, 1, limit=1), [(1, 0.5)])
+        self.assertEqual(
+            cooking._cooking_index.changed[self.recipes[0].pk], frozenset()
+        )
+
+    def test_deleted_recipes_left_in_index_are_skipped(self):
+        self.assertEqual(self.cook(0, 1), [(0, 1.0), (1, 0.5)])
+        Recipe.objects.filter(pk=self.recipes[0].pk).delete()
+        # Индекс, построенный в фоне до удаления, снова содержит рецепт.
+        with mock.patch(
+            'api.v1.views.forget_recipes'
+        ) as forget, mock.patch.object(
+            cooking.CookingIndex, 'search', autospec=True,
+            side_effect=cooking.CookingIndex.search
+        ) as search:
+            self.assertEqual(self.cook(0, 1), [(1, 0.5)])
+        self.assertEqual(forget.call_count, settings.COOKING_SEARCH_ATTEMPTS)
+        self.assertEqual(search.call_count, settings.COOKING_SEARCH_ATTEMPTS)
+
+    @override_settings(COOKING_INDEX_CHANGES_MAX=0)
+    def test_index_rebuilt_in_background(self):
+        self.assertEqual(self.cook(3), [(1, 0.25)])
+        IngredientRecipe.objects.create(
+            recipe=self.recipes[2], ingredient=self.ingredients[3], amount=1
+        )
+        with mock.patch.object(cooking, 'run_in_background') as background:
+            # Пока новый индекс строится, поиск идёт по прежнему.
+            self.assertEqual(self.cook(3), [(1, 0.25)])
+            self.assertEqual(self.cook(3), [(1, 0.25)])
+        background.assert_called_once()
+        function, versions = background.call_args[0]
+        function(versions)
+        self.assertFalse(cooking._rebuilding)
+        self.assertEqual(self.cook(3), [(2, 0.5), (1, 0.25)])
+        self.assertEqual(cooking._cooking_index.changed, {})
+
+    def test_index_matches_full_scan(self):
+        random.seed(1)
+        # Ингредиент 1 есть во всех рецептах, остальные редкие.
+        recipes = {
+            recipe_id: {1, *random.sample(range(2, 300), random.randint(0, 5))}
+            for recipe_id in range(1, 500)
+        }
+        index = cooking.CookingIndex(
+            sorted(
+                (recipe_id, ingredient_id)
+                for recipe_id, ingredient_ids in recipes.items()
+                for ingredient_id in ingredient_ids
+            ),
+            499, None, None
+        )
+        self.assertEqual(
+            {type(recipe_ids) for recipe_ids in index.postings.values()},
+            {int, array}
+        )
+        changes = {1: frozenset({1, 2}), 2: frozenset(), 600: frozenset({3})}
+        index = index.updated(changes, None, None)
+        recipes.update(changes)
+        for min_coverage in (0, 0.5):
+            wanted = {1, *random.sample(range(2, 300), 30)}
+            expected = sorted(
+                (
+                    (len(wanted & ingredient_ids) / len(ingredient_ids),
+                     len(wanted & ingredient_ids), recipe_id)
+                    for recipe_id, ingredient_ids in recipes.items()
+                    if wanted & ingredient_ids
+                ),
+                reverse=True
+            )
+            self.assertEqual(
+                index.search(wanted, 20, min_coverage),
+                [
+                    (recipe_id, coverage)
+                    for coverage, _, recipe_id in expected
+                    if coverage >= min_coverage
+                ][:20]
+            )
+
+
+class QueryPlanTest(TestCase):
+    """Проверяет, что частые запросы не просматривают таблицы целиком."""
+
+    def test_check_query_plans(self):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(20)
+        )
+        with override_settings(MEDIA_ROOT=tempfile.mkdtemp()):
+            call_command(
+                'generate_data', users=10, recipes=50, tags=4,
+                subscriptions=3, stdout=io.StringIO()
+            )
+        call_command('check_query_plans', min_rows=0, stdout=io.StringIO())
@@ -0,0 +1,239 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection, transaction
+from django.utils.functional import cached_property
+
+VERSION_KEY = 'version:{}'
+COUNT_KEY = 'recipes_count:{}'
+RESPONSE_KEY = 'recipes_response:{}'
+LOCK_KEY = '{}:lock'
+
+RECIPES_SCOPE = 'recipes'
+RECIPE_SCOPE = 'recipe:{}'
+RECIPES_CONTENT_SCOPE = 'recipes_content'
+FAVORITES_SCOPE = 'favorites:{}'
+SHOPPING_CART_SCOPE = 'shopping_cart:{}'
+SUBSCRIPTIONS_SCOPE = 'subscriptions:{}'
+POPULARITY_SCOPE = 'popularity'
+TAGS_SCOPE = 'tags'
+INGREDIENTS_SCOPE = 'ingredients'
+
+# Параметры запроса, не влияющие на состав выборки.
+NON_FILTER_PARAMS = ('page', 'limit', 'cursor', 'fields', 'omit', 'ordering')
+
+MS_PER_SECOND = 1000
+
+# Блокировки потоков одного процесса при заполнении кэша.
+_fill_locks = [threading.Lock() for _ in range(64)]
+
+
+def now_version():
+    """Текущее время в миллисекундах - основа значений версий."""
+    return int(time.time() * MS_PER_SECOND)
+
+
+def get_version(scope):
+    """
+    Возвращает текущую версию области данных.
+    Версия - это время последнего изменения в миллисекундах, поэтому
+    после очистки кэша версии не совпадут с уже выданными ранее,
+    а их значение годится для заголовка 'Last-Modified'.
+    """
+    key = VERSION_KEY.format(scope)
+    version = cache.get(key)
+    if version is not None:
+        return version
+    cache.add(key, now_version(), None)
+    return cache.get(key)
+
+
+def bump_version(scope):
+    """Увеличивает версию области данных, делая устаревшими её ключи."""
+    key = VERSION_KEY.format(scope)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, now_version(), None)
+        return
+    try:
+        cache.incr(key, max(now_version() - version, 1))
+    except ValueError:
+        cache.add(key, now_version(), None)
+
+
+def version_timestamp(*versions):
+    """Время последнего изменения в секундах по набору версий."""
+    return max(versions) // MS_PER_SECOND
+
+
+def bump_version_on_commit(scope):
+    """
+    Увеличивает версию сразу и повторно после фиксации текущей транзакции,
+    чтобы данные, прочитанные до фиксации, не остались в кэше.
+    """
+    bump_version(scope)
+    transaction.on_commit(lambda: bump_version(scope))
+
+
+def make_key(*parts):
+    """Собирает короткий ключ кэша из произвольных значений."""
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def get_filter_params(request):
+    """Нормализованные параметры фильтрации запроса."""
+    return tuple(sorted(
+        (name, tuple(sorted(set(request.query_params.getlist(name)))))
+        for name in request.query_params
+        if name not in NON_FILTER_PARAMS
+    ))
+
+
+def get_user_scopes(request):
+    """
+    Области данных текущего пользователя, от которых зависит выборка
+    с фильтрами по 'списку избранного' и 'списку покупок'.
+    """
+    user = request.user
+    if user.is_anonymous:
+        return ()
+    scopes = []
+    for param, scope in (
+        ('is_favorited', FAVORITES_SCOPE),
+        ('is_in_shopping_cart', SHOPPING_CART_SCOPE)
+    ):
+        try:
+            value = int(request.query_params.get(param, 0))
+        except ValueError:
+            continue
+        if value:
+            scopes.append(scope.format(user.pk))
+    return tuple(scopes)
+
+
+def get_ordering_scopes(request):
+    """
+    Области данных, от которых зависит порядок рецептов в выборке:
+    при сортировке по популярности - добавления в избранное всех
+    пользователей.
+    """
+    if request.query_params.get('ordering') == 'popular':
+        return (POPULARITY_SCOPE,)
+    return ()
+
+
+def get_count_cache_key(request):
+    """Ключ кэша количества рецептов для параметров фильтрации запроса."""
+    scopes = (RECIPES_SCOPE,) + get_user_scopes(request)
+    return COUNT_KEY.format(make_key(
+        get_filter_params(request),
+        tuple((scope, get_version(scope)) for scope in scopes)
+    ))
+
+
+def get_approximate_count(model):
+    """
+    Оценка количества строк таблицы по статистике PostgreSQL.
+    Для других СУБД и таблиц без статистики возвращает None.
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples FROM pg_class WHERE relname = %s',
+            [model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class CachedCountPaginator(Paginator):
+    """Пагинатор, берущий общее количество объектов из кэша."""
+
+    def __init__(self, *args, cache_key=None, approximate=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_key = cache_key
+        self.approximate = approximate
+
+    @cached_property
+    def count(self):
+        if self.approximate:
+            count = get_approximate_count(self.object_list.model)
+            if count is not None:
+                return count
+        count = cache.get(self.cache_key)
+        if count is None:
+            count = super().count
+            cache.set(
+                self.cache_key, count, settings.RECIPES_COUNT_CACHE_TIMEOUT
+            )
+        return count
+
+
+def get_list_response_key(request):
+    """Ключ кэша анонимного ответа со списком рецептов."""
+    return RESPONSE_KEY.format(make_key(
+        request.build_absolute_uri('/'),
+        tuple(sorted(
+            (name, tuple(request.query_params.getlist(name)))
+            for name in request.query_params
+        )),
+        get_version(RECIPES_SCOPE),
+        get_version(RECIPES_CONTENT_SCOPE),
+        tuple(get_version(scope) for scope in get_ordering_scopes(request))
+    ))
+
+
+def get_detail_response_key(request, pk):
+    """Ключ кэша анонимного ответа с одним рецептом."""
+    return RESPONSE_KEY.format(make_key(
+        request.build_absolute_uri('/'),
+        str(pk),
+        get_version(RECIPE_SCOPE.format(pk)),
+        get_version(RECIPES_CONTENT_SCOPE)
+    ))
+
+
+def get_or_build(key, build, timeout):
+    """
+    Возвращает значение из кэша, а при его отсутствии строит его
+    единожды: потоки процесса ждут на локальной блокировке, другие
+    процессы - на блокировке в кэше, пока первый не сохранит значение.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+    with _fill_locks[hash(key) % len(_fill_locks)]:
+        value = cache.get(key)
+        if value is not None:
+            return value
+        lock_key = LOCK_KEY.format(key)
+        locked = cache.add(lock_key, True, settings.CACHE_FILL_LOCK_TIMEOUT)
+        if not locked:
+            value = wait_for(key, settings.CACHE_FILL_LOCK_TIMEOUT)
+            if value is not None:
+                return value
+        try:
+            value = build()
+            cache.set(key, value, timeout)
+        finally:
+            if locked:
+                cache.delete(lock_key)
+    return value
+
+
+def wait_for(key, timeout):
+    """Ожидает появления значения в кэше, пока его строит другой процесс."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(settings.CACHE_FILL_POLL_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+    return None
@@ -0,0 +1,295 @@
+import copy
+import heapq
+import threading
+from array import array
+from collections import defaultdict
+from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Max
+from django.utils import timezone
+
+from head.models import IngredientRecipe, Recipe
+
+from .caches import RECIPES_CONTENT_SCOPE, RECIPES_SCOPE, get_version
+
+_index_lock = threading.Lock()
+_cooking_index = None
+# Индекс строится заново в отдельном потоке.
+_rebuilding = False
+
+# Ингредиент, который есть хотя бы в 1/DENSE_RATIO рецептов, хранится
+# битовой картой: она занимает не больше 2 размеров массива id.
+DENSE_RATIO = 64
+
+
+def to_bitmap(recipe_ids, length):
+    """Битовая карта (целое число), в которой установлены биты id."""
+    buffer = bytearray(length // 8 + 1)
+    for recipe_id in recipe_ids:
+        buffer[recipe_id >> 3] |= 1 << (recipe_id & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def iter_bits(bitmap):
+    """Номера установленных битов, начиная со старшего."""
+    while bitmap:
+        bit = bitmap.bit_length() - 1
+        yield bit
+        bitmap ^= 1 << bit
+
+
+class CookingIndex:
+    """
+    Обратный индекс рецептов по ингредиентам для поиска 'что приготовить'.
+    Для каждого ингредиента хранит id рецептов с ним: компактным массивом
+    или, для частых ингредиентов, битовой картой, где номер бита - id
+    рецепта. При поиске битовые карты имеющихся ингредиентов складываются
+    поразрядно, так что число совпадений всех рецептов считается
+    операциями над целыми числами, а не циклом по рецептам. Доля
+    совпадений зависит только от их числа и числа ингредиентов рецепта,
+    поэтому рецепты выбираются по битовым картам размеров рецептов
+    в порядке убывания этой доли.
+    Рецепты, изменённые после построения, хранятся отдельно вместе
+    с множествами их ингредиентов и исключены из битовых карт размеров.
+    """
+
+    def __init__(self, rows, max_recipe_id, versions, synced_at):
+        """
+        'rows' - пары (id рецепта, id ингредиента), упорядоченные по
+        id рецепта.
+        """
+        self.versions = versions
+        self.synced_at = synced_at
+        postings = defaultdict(lambda: array('I'))
+        by_size = defaultdict(lambda: array('I'))
+        for recipe_id, group in groupby(rows, key=itemgetter(0)):
+            ingredient_ids = {ingredient_id for _, ingredient_id in group}
+            by_size[len(ingredient_ids)].append(recipe_id)
+            for ingredient_id in ingredient_ids:
+                postings[ingredient_id].append(recipe_id)
+            max_recipe_id = max(max_recipe_id, recipe_id)
+        self.length = max_recipe_id + 1
+        self.postings = {
+            ingredient_id: (
+                to_bitmap(recipe_ids, self.length)
+                if len(recipe_ids) * DENSE_RATIO >= self.length
+                else recipe_ids
+            )
+            for ingredient_id, recipe_ids in postings.items()
+        }
+        self.size_bitmaps = {
+            size: to_bitmap(recipe_ids, self.length)
+            for size, recipe_ids in by_size.items()
+        }
+        self.changed = {}
+
+    def updated(self, recipe_ingredients, versions, synced_at):
+        """
+        Копия индекса с новыми наборами ингредиентов рецептов (пустой
+        набор - рецепт удалён). Основные данные общие с исходным
+        индексом, который могут в это время читать другие потоки.
+        """
+        index = copy.copy(self)
+        index.versions = versions
+        index.synced_at = synced_at
+        index.changed = {**self.changed, **recipe_ingredients}
+        stale = to_bitmap(
+            (recipe_id for recipe_id in recipe_ingredients
+             if recipe_id < self.length),
+            self.length
+        )
+        if stale:
+            index.size_bitmaps = {
+                size: bitmap & ~stale
+                for size, bitmap in self.size_bitmaps.items()
+            }
+        return index
+
+    def get_bitmap(self, ingredient_id):
+        recipe_ids = self.postings.get(ingredient_id, 0)
+        if isinstance(recipe_ids, int):
+            return recipe_ids
+        return to_bitmap(recipe_ids, self.length)
+
+    def count_matches(self, ingredient_ids):
+        """
+        Разряды числа совпадений всех рецептов: i-я битовая карта
+        содержит i-й двоичный разряд числа имеющихся ингредиентов рецепта.
+        """
+        digits = []
+        for ingredient_id in ingredient_ids:
+            carry = self.get_bitmap(ingredient_id)
+            for position, digit in enumerate(digits):
+                if not carry:
+                    break
+                digits[position], carry = digit ^ carry, digit & carry
+            if carry:
+                digits.append(carry)
+        return digits
+
+    def get_exact_matches(self, digits, matched):
+        """Битовая карта рецептов ровно с 'matched' совпадениями."""
+        if matched >> len(digits):
+            return 0
+        bitmap = -1
+        for position, digit in enumerate(digits):
+            bitmap &= digit if matched >> position & 1 else ~digit
+        return bitmap
+
+    def search_built(self, ingredient_ids, limit, min_coverage):
+        """Лучшие рецепты, не изменённые после построения индекса."""
+        digits = self.count_matches(ingredient_ids)
+        levels = sorted(
+            (
+                (matched / size, matched, size)
+                for size in self.size_bitmaps
+                for matched in range(1, min(size, len(ingredient_ids)) + 1)
+            ),
+            reverse=True
+        )
+        exact = {}
+        found = []
+        for coverage, matched, size in levels:
+            if coverage < min_coverage or len(found) >= limit:
+                break
+            if matched not in exact:
+                exact[matched] = self.get_exact_matches(digits, matched)
+            bitmap = exact[matched] & self.size_bitmaps[size]
+            for recipe_id in iter_bits(bitmap):
+                found.append((coverage, matched, recipe_id))
+                if len(found) >= limit:
+                    break
+        return found
+
+    def search(self, ingredient_ids, limit, min_coverage=0):
+        """
+        До 'limit' пар (id рецепта, доля его ингредиентов из
+        'ingredient_ids') по убыванию доли, числа совпадений и id.
+        """
+        wanted = set(ingredient_ids)
+        ranked = self.search_built(wanted, limit, min_coverage)
+        for recipe_id, recipe_ingredients in self.changed.items():
+            matched = len(wanted & recipe_ingredients)
+            if matched and matched >= min_coverage * len(recipe_ingredients):
+                ranked.append(
+                    (matched / len(recipe_ingredients), matched, recipe_id)
+                )
+        return [
+            (recipe_id, coverage)
+            for coverage, _, recipe_id in heapq.nlargest(limit, ranked)
+        ]
+
+
+def get_recipe_ingredients(recipe_ids):
+    """Множества ингредиентов рецептов, пустые - для удалённых."""
+    recipe_ingredients = {recipe_id: set() for recipe_id in recipe_ids}
+    for recipe_id, ingredient_id in IngredientRecipe.objects.filter(
+        recipe__in=recipe_ids
+    ).values_list('recipe', 'ingredient'):
+        recipe_ingredients[recipe_id].add(ingredient_id)
+    return {
+        recipe_id: frozenset(ingredient_ids)
+        for recipe_id, ingredient_ids in recipe_ingredients.items()
+    }
+
+
+def build_cooking_index(versions):
+    synced_at = timezone.now()
+    max_recipe_id = Recipe.objects.aggregate(last=Max('pk'))['last'] or 0
+    rows = IngredientRecipe.objects.order_by('recipe').values_list(
+        'recipe', 'ingredient'
+    ).iterator(chunk_size=10000)
+    return CookingIndex(rows, max_recipe_id, versions, synced_at)
+
+
+def refresh_cooking_index(index, versions):
+    """
+    Добавляет в индекс рецепты, изменённые после его обновления, или
+    возвращает None, если их больше COOKING_INDEX_CHANGES_MAX и индекс
+    нужно построить заново.
+    Выборка захватывает и COOKING_INDEX_OVERLAP секунд до него: время
+    изменения рецепта ставится до фиксации транзакции.
+    """
+    synced_at = timezone.now()
+    recipe_ids = list(Recipe.objects.filter(
+        updated_at__gte=index.synced_at - timedelta(
+            seconds=settings.COOKING_INDEX_OVERLAP
+        )
+    ).values_list('pk', flat=True))
+    if len(index.changed) + len(recipe_ids) > (
+        settings.COOKING_INDEX_CHANGES_MAX
+    ):
+        return None
+    return index.updated(
+        get_recipe_ingredients(recipe_ids), versions, synced_at
+    )
+
+
+def rebuild_cooking_index(versions):
+    """Строит индекс заново и заменяет им индекс процесса."""
+    global _cooking_index, _rebuilding
+    try:
+        index = build_cooking_index(versions)
+        with _index_lock:
+            _cooking_index = index
+    finally:
+        _rebuilding = False
+
+
+def run_in_background(function, *args):
+    """Выполняет функцию в отдельном потоке со своими соединениями с БД."""
+    def run():
+        try:
+            function(*args)
+        finally:
+            connections.close_all()
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def get_cooking_index():
+    """
+    Индекс текущего процесса. Строится при запуске процесса (см. wsgi.py)
+    или при первом поиске, а после изменения рецептов дополняется
+    изменёнными рецептами. Если их слишком много, индекс строится заново
+    в фоне, а поиск до готовности нового индекса идёт по прежнему.
+    """
+    global _cooking_index, _rebuilding
+    versions = [get_version(RECIPES_SCOPE), get_version(RECIPES_CONTENT_SCOPE)]
+    index = _cooking_index
+    if index is not None and (index.versions == versions or _rebuilding):
+        return index
+    with _index_lock:
+        index = _cooking_index
+        if index is None:
+            index = build_cooking_index(versions)
+        elif index.versions != versions and not _rebuilding:
+            refreshed = refresh_cooking_index(index, versions)
+            if refreshed is None:
+                _rebuilding = True
+                run_in_background(rebuild_cooking_index, versions)
+            else:
+                index = refreshed
+        _cooking_index = index
+    return index
+
+
+def warm_up_cooking_index():
+    """Строит индекс в отдельном потоке при запуске веб-сервера."""
+    run_in_background(get_cooking_index)
+
+
+def forget_recipes(recipe_ids):
+    """Исключает из индекса рецепты, которых уже нет в БД."""
+    global _cooking_index
+    with _index_lock:
+        index = _cooking_index
+        if index is not None:
+            _cooking_index = index.updated(
+                dict.fromkeys(recipe_ids, frozenset()),
+                index.versions, index.synced_at
+            )
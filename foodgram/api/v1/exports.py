@@ -0,0 +1,89 @@
+import csv
+import json
+
+from django.http import StreamingHttpResponse
+from rest_framework.negotiation import DefaultContentNegotiation
+
+CONTENT_TYPES = {
+    'txt': 'text/plain; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+    'json': 'application/json',
+}
+
+CSV_HEADER = ('Название', 'Ед. изм.', 'Количество')
+
+
+class ExportContentNegotiation(DefaultContentNegotiation):
+    """
+    Параметр 'format' выбирает формат выгружаемого файла, а не рендерер
+    ответа, поэтому ошибки всегда отдаются первым рендерером.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class Echo:
+    """Псевдофайл, возвращающий записанную строку вместо её хранения."""
+
+    def write(self, value):
+        return value
+
+
+def iter_txt(items):
+    for item in items:
+        yield '{} ({}) - {}\n'.format(
+            item['name'], item['measurement_unit'], item['total']
+        )
+
+
+def iter_csv(items):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for item in items:
+        yield writer.writerow(
+            (item['name'], item['measurement_unit'], item['total'])
+        )
+
+
+def iter_json(items):
+    separator = '['
+    for item in items:
+        yield separator + json.dumps(
+            {
+                'id': item['ingredient'],
+                'name': item['name'],
+                'measurement_unit': item['measurement_unit'],
+                'amount': item['total']
+            },
+            ensure_ascii=False
+        )
+        separator = ','
+    yield ']' if separator == ',' else '[]'
+
+
+EXPORTERS = {
+    'txt': iter_txt,
+    'csv': iter_csv,
+    'json': iter_json,
+}
+
+FORMATS = ('pdf',) + tuple(EXPORTERS)
+
+
+def stream_shopping_list(items, export_format):
+    """
+    Отдаёт список покупок в текстовом формате потоком строк,
+    читая их из БД итератором без промежуточного списка.
+    """
+    response = StreamingHttpResponse(
+        (
+            line.encode()
+            for line in EXPORTERS[export_format](items.iterator())
+        ),
+        content_type=CONTENT_TYPES[export_format]
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="shopping_cart.{export_format}"'
+    )
+    return response
@@ -1,6 +1,22 @@
+from django.conf import settings
+from django.db.models import F
 from django_filters import rest_framework as filters
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
 
-from head.models import Recipe, Tag
+from head.models import TAG_MASK_BITS, Recipe, Tag, get_tag_mask
+
+from .search import (fuzzy_search_ingredients, get_ingredient_index,
+                     search_recipes)
+
+# Сортировки списка рецептов. Все поля каждой сортировки идут в одном
+# направлении и заканчиваются id, поэтому она однозначна, годится для
+# пагинации по ключу и совпадает с индексом (по ключу или из Recipe.Meta).
+RECIPE_ORDERINGS = {
+    'new': ('-id',),
+    'quick': ('cooking_time', 'id'),
+    'popular': ('-favorites_count', '-id'),
+}
 
 
 class RecipeFilter(filters.FilterSet):
@@ -15,7 +31,18 @@ class RecipeFilter(filters.FilterSet):
     tags = filters.ModelMultipleChoiceFilter(
         field_name='tags__slug',
         queryset=Tag.objects.all(),
-        to_field_name='slug'
+        to_field_name='slug',
+        method='filter_tags'
+    )
+    cooking_time__gte = filters.NumberFilter(
+        field_name='cooking_time', lookup_expr='gte'
+    )
+    cooking_time__lte = filters.NumberFilter(
+        field_name='cooking_time', lookup_expr='lte'
+    )
+    ordering = filters.ChoiceFilter(
+        choices=[(name, name) for name in RECIPE_ORDERINGS],
+        method='filter_ordering'
     )
 
     class Meta:
@@ -24,8 +51,69 @@ class RecipeFilter(filters.FilterSet):
             'author',
         )
 
+    def filter_tags(self, queryset, name, tags):
+        """
+        Рецепты хотя бы с одним из тегов - по маске тегов рецепта,
+        без соединения с таблицами тегов и без DISTINCT.
+        """
+        if not tags:
+            return queryset
+        if any(tag.pk > TAG_MASK_BITS for tag in tags):
+            return queryset.filter(tags__in=tags).distinct()
+        return queryset.annotate(
+            tag_match=F('tag_mask').bitand(
+                get_tag_mask(tag.pk for tag in tags)
+            )
+        ).exclude(tag_match=0)
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(*RECIPE_ORDERINGS[value])
+
     def filter_users_lists(self, queryset, name, value):
         user = self.request.user
         if user.is_anonymous or not int(value):
             return queryset
         return queryset.filter(**{name: user})
+
+
+class RecipeSearchFilter(BaseFilterBackend):
+    """
+    Полнотекстовый поиск рецептов по названию и описанию (параметр
+    'search') с сортировкой по релевантности, если сортировка не задана
+    параметром 'ordering'. Сочетается с фильтрами RecipeFilter
+    и пагинацией.
+    """
+
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if view.action != 'list' or not query.strip():
+            return queryset
+        ordering = queryset.query.order_by
+        queryset = search_recipes(queryset, query)
+        if ordering:
+            return queryset.order_by(*ordering)
+        return queryset
+
+
+class IngredientSearchFilter(BaseFilterBackend):
+    """
+    Поиск ингредиентов по названию для автодополнения: сначала
+    совпадения по началу названия, затем по его части. Выполняется
+    по индексу в памяти процесса, без запросов к БД.
+    С параметром 'fuzzy=1' ищет названия, похожие на запрос,
+    что находит ингредиенты и при опечатках.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(api_settings.SEARCH_PARAM, '')
+        if view.action != 'list' or not query.strip():
+            return queryset
+        if request.query_params.get('fuzzy') in ('1', 'true'):
+            return fuzzy_search_ingredients(
+                query, settings.INGREDIENTS_SEARCH_LIMIT
+            )
+        return get_ingredient_index().search(
+            query, settings.INGREDIENTS_SEARCH_LIMIT
+        )
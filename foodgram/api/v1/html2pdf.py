@@ -1,8 +1,8 @@
 import os
 import sys
+from io import BytesIO
 
 from django.conf import settings
-from django.http import HttpResponse
 from django.template.loader import get_template
 from xhtml2pdf import pisa
 from xhtml2pdf.files import pisaFileObject
@@ -24,10 +24,11 @@ def link_callback(uri, rel):
     return path or None
 
 
-def html_to_pdf(template, context):
-    """Преобразует html-страницу с данными из БД в PDF-файл."""
-    response = HttpResponse(content_type="application/pdf")
-    response["Content-Disposition"] = 'filename="shopping_cart.pdf"'
+def render_pdf(template, context):
+    """
+    Преобразует html-страницу с данными из БД в содержимое PDF-файла.
+    При ошибке генерации возвращает None.
+    """
     template = get_template(template)
     html = template.render(context)
     if sys.platform == 'win32':
@@ -35,11 +36,12 @@ def html_to_pdf(template, context):
             lambda self: settings.STATIC_ROOT
             + self.uri.replace(settings.STATIC_URL, '\\')
         )
+    dest = BytesIO()
     pdf = pisa.CreatePDF(
-        html, dest=response,
+        html, dest=dest,
         encoding="utf-8",
         link_callback=link_callback
     )
     if not pdf.err:
-        return response
+        return dest.getvalue()
     return None
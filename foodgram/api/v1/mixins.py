@@ -0,0 +1,234 @@
+from collections import OrderedDict
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+from rest_framework.serializers import ListSerializer
+
+from .caches import (get_detail_response_key, get_list_response_key,
+                     get_or_build, get_version, make_key, version_timestamp)
+from .throttles import release_slots
+
+# Содержимое ответов для 'RenderedResponseCacheMixin'.
+_rendered_responses = {}
+
+
+def get_fields_param(request, name):
+    """Имена полей из параметра запроса, перечисленные через запятую."""
+    return {
+        field.strip()
+        for value in request.query_params.getlist(name)
+        for field in value.split(',')
+        if field.strip()
+    }
+
+
+def get_requested_fields(request, fields):
+    """
+    Оставляет из переданных имён полей те, что запрошены параметром
+    'fields' и не исключены параметром 'omit'.
+    """
+    requested = set(fields)
+    if request is None:
+        return requested
+    only = get_fields_param(request, 'fields')
+    if only:
+        requested &= only
+    return requested - get_fields_param(request, 'omit')
+
+
+class SparseFieldsMixin:
+    """
+    Позволяет ограничить набор полей сериализатора параметрами запроса
+    'fields' и 'omit'. Применяется только к объектам верхнего уровня
+    ответа, вложенные сериализаторы отдают все поля.
+    """
+
+    def is_response_root(self):
+        parent = self.parent
+        if isinstance(parent, ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.is_response_root():
+            return fields
+        requested = get_requested_fields(self.context.get('request'), fields)
+        return OrderedDict(
+            (name, field) for name, field in fields.items()
+            if name in requested
+        )
+
+
+class ConditionalGetMixin:
+    """
+    Добавляет к ответам на запросы списка и отдельного объекта заголовки
+    'ETag' и 'Last-Modified', вычисленные по версиям данных, и отвечает
+    кодом 304 на условные запросы до построения ответа.
+    Ответы представлений с 'public_cache = True' не зависят от
+    пользователя, и их разрешено кэшировать nginx и браузерам
+    на 'CATALOG_CACHE_MAX_AGE' секунд с последующей перепроверкой.
+    'Last-Modified' берётся из версий, а не из даты изменения объекта:
+    ответ зависит и от связанных данных (названий ингредиентов, автора,
+    списков пользователя), которые эта дата не отражает.
+    """
+
+    public_cache = False
+
+    def get_condition_scopes(self, request):
+        """
+        Области данных, от которых зависит ответ. Без них условные
+        запросы не обрабатываются и ответ не кэшируется.
+        """
+        return ()
+
+    def get_last_modified(self, request, versions):
+        """Время последнего изменения данных ответа в секундах."""
+        return version_timestamp(*versions)
+
+    def conditional_response(self, request, build, *args, **kwargs):
+        scopes = self.get_condition_scopes(request)
+        if not scopes:
+            return build(request, *args, **kwargs)
+        versions = [get_version(scope) for scope in scopes]
+        last_modified = self.get_last_modified(request, versions)
+        user_id = None if self.public_cache else request.user.pk
+        etag = quote_etag(make_key(
+            request.get_full_path(), user_id, versions, last_modified
+        ))
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = build(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            if self.public_cache:
+                patch_cache_control(
+                    response,
+                    public=True,
+                    max_age=settings.CATALOG_CACHE_MAX_AGE,
+                    must_revalidate=True
+                )
+            else:
+                patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, super().list, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, super().retrieve, *args, **kwargs
+        )
+
+
+class AnonymousResponseCacheMixin:
+    """
+    Кэширует данные ответов на запросы списка и отдельного объекта
+    для анонимных пользователей.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if not request.user.is_anonymous:
+            return super().list(request, *args, **kwargs)
+        data = get_or_build(
+            get_list_response_key(request),
+            lambda: super(AnonymousResponseCacheMixin, self).list(
+                request, *args, **kwargs
+            ).data,
+            settings.RECIPES_RESPONSE_CACHE_TIMEOUT
+        )
+        return Response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not request.user.is_anonymous:
+            return super().retrieve(request, *args, **kwargs)
+        data = get_or_build(
+            get_detail_response_key(request, kwargs[self.lookup_field]),
+            lambda: super(AnonymousResponseCacheMixin, self).retrieve(
+                request, *args, **kwargs
+            ).data,
+            settings.RECIPES_RESPONSE_CACHE_TIMEOUT
+        )
+        return Response(data)
+
+
+class RenderedResponseCacheMixin:
+    """
+    Хранит в памяти процесса готовое JSON-содержимое ответов на запросы
+    без параметров, пока не изменились версии областей данных
+    представления, и отдаёт его без запросов к БД и сериализации.
+    """
+
+    def rendered_response(self, request, build, *args, **kwargs):
+        renderer = request.accepted_renderer
+        scopes = self.get_condition_scopes(request)
+        if request.query_params or renderer.format != 'json' or not scopes:
+            return build(request, *args, **kwargs)
+        versions = [get_version(scope) for scope in scopes]
+        key = (type(self).__name__, request.path, request.accepted_media_type)
+        cached = _rendered_responses.get(key)
+        if cached is None or cached[0] != versions:
+            response = build(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            content = renderer.render(
+                response.data,
+                request.accepted_media_type,
+                self.get_renderer_context()
+            )
+            if len(_rendered_responses) >= settings.RENDERED_RESPONSES_MAX:
+                _rendered_responses.clear()
+            cached = _rendered_responses[key] = (versions, content)
+        return HttpResponse(cached[1], content_type=renderer.media_type)
+
+    def list(self, request, *args, **kwargs):
+        return self.rendered_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.rendered_response(
+            request, super().retrieve, *args, **kwargs
+        )
+
+
+class SlotReleasingContent:
+    """
+    Содержимое потокового ответа, которое освобождает места запроса
+    в 'ConcurrencyThrottle' при закрытии ответа сервером.
+    """
+
+    def __init__(self, content, view):
+        self.content = content
+        self.view = view
+
+    def __iter__(self):
+        return iter(self.content)
+
+    def close(self):
+        release_slots(self.view)
+
+
+class ConcurrencyLimitMixin:
+    """
+    Освобождает места, занятые запросом в 'ConcurrencyThrottle',
+    когда ответ представления готов, в том числе при ошибке. Потоковый
+    ответ выполняет запросы к БД, пока передаётся клиенту, поэтому его
+    места освобождаются только при закрытии ответа.
+    """
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if getattr(response, 'streaming', False):
+            response.streaming_content = SlotReleasingContent(
+                response.streaming_content, self
+            )
+        else:
+            release_slots(self)
+        return super().finalize_response(request, response, *args, **kwargs)
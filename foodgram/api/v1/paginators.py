@@ -1,9 +1,200 @@
-from rest_framework.pagination import PageNumberPagination
+from functools import partial
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (CursorPagination, PageNumberPagination,
+                                       _reverse_ordering)
+
+from .caches import CachedCountPaginator, get_filter_params
+
+
+class CustomCursorPagination(CursorPagination):
+    """
+    Пагинатор по ключу (keyset): страница выбирается условием по id,
+    а не через OFFSET, и не требует подсчёта COUNT(*).
+    Если выборка явно упорядочена по полям модели в одном направлении
+    с первичным ключом последним (например, параметром 'ordering'
+    фильтра рецептов), ключом служат значения всех этих полей,
+    и страница выбирается по составному индексу по тем же полям.
+    """
+
+    page_size = 10
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    ordering = '-id'
+
+    def decode_cursor(self, request):
+        # Пустой параметр 'cursor' означает первую страницу.
+        if not request.query_params.get(self.cursor_query_param):
+            return None
+        # Позиции однозначны, поэтому смещение в курсорах не нужно.
+        return super().decode_cursor(request)._replace(offset=0)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = queryset.query.order_by
+        if ordering and self.get_ordering_fields(queryset.model, ordering):
+            return tuple(ordering)
+        return super().get_ordering(request, queryset, view)
+
+    def get_ordering_fields(self, model, ordering):
+        """
+        Поля модели сортировки или None, если сортировка не годится
+        для пагинации по ключу.
+        """
+        if not all(isinstance(name, str) for name in ordering):
+            return None
+        if len({name.startswith('-') for name in ordering}) > 1:
+            return None
+        try:
+            fields = [
+                model._meta.get_field(name.lstrip('-')) for name in ordering
+            ]
+        except FieldDoesNotExist:
+            return None
+        if fields[-1] != model._meta.pk or any(
+            not field.concrete or field.is_relation for field in fields
+        ):
+            return None
+        return fields
+
+    def get_position_values(self, model, position):
+        """Значения полей сортировки из позиции курсора."""
+        fields = self.get_ordering_fields(model, self.ordering)
+        values = position.split(',')
+        if fields is None or len(values) != len(fields):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            return [
+                field.to_python(value) for field, value in zip(fields, values)
+            ]
+        except ValidationError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_position_filters(self, model, position, reverse):
+        """
+        Условия для объектов после позиции в порядке выдачи (или до неё).
+        Для сортировки (a, id) это сначала a = x и id < y, затем a < x:
+        каждое условие выбирается по составному индексу с точной
+        границей, тогда как для сравнения строк '(a, id) < (x, y)'
+        SQLite ограничивает по индексу только a и просматривает
+        все объекты с a = x.
+        """
+        names = [name.lstrip('-') for name in self.ordering]
+        values = self.get_position_values(model, position)
+        lookup = 'lt' if self.ordering[0].startswith('-') != reverse else 'gt'
+        return [
+            Q(
+                **dict(zip(names[:size], values[:size])),
+                **{f'{names[size]}__{lookup}': values[size]}
+            )
+            for size in reversed(range(len(names)))
+        ]
+
+    def get_results(self, queryset, position, reverse, count):
+        """До 'count' объектов после позиции, по запросу на условие."""
+        if position is None:
+            return list(queryset[:count])
+        results = []
+        for condition in self.get_position_filters(
+            queryset.model, position, reverse
+        ):
+            results += queryset.filter(condition)[:count - len(results)]
+            if len(results) >= count:
+                break
+        return results
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        Повторяет CursorPagination.paginate_queryset, но выбирает
+        страницу по позиции из значений всех полей сортировки.
+        """
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        _, reverse, current_position = self.cursor or (0, False, None)
+        results = self.get_results(
+            queryset.order_by(*(
+                _reverse_ordering(self.ordering) if reverse else self.ordering
+            )),
+            current_position, reverse, self.page_size + 1
+        )
+        self.page = results[:self.page_size]
+        following_position = None
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+        self.set_positions(reverse, current_position, following_position)
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def set_positions(self, reverse, current_position, following_position):
+        """Позиции соседних страниц, как в CursorPagination."""
+        preceding = current_position is not None
+        following = following_position is not None
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = preceding, following
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next, self.has_previous = following, preceding
+            self.next_position = following_position
+            self.previous_position = current_position
+
+    def _get_position_from_instance(self, instance, ordering):
+        return ','.join(
+            str(instance[name] if isinstance(instance, dict) else getattr(
+                instance, name
+            ))
+            for name in (name.lstrip('-') for name in ordering)
+        )
 
 
 class CustomPagination(PageNumberPagination):
-    """Кастомный пагинатор проекта."""
+    """
+    Кастомный пагинатор проекта.
+    По умолчанию постраничный, при наличии параметра 'cursor'
+    (в том числе пустого) переключается на пагинацию по ключу.
+    Если представление определяет метод 'get_count_cache_key',
+    общее количество объектов берётся из кэша.
+    """
 
     page_size = 10
     page_size_query_param = 'limit'
     max_page_size = 100
+    cursor_query_param = 'cursor'
+    cursor_class = CustomCursorPagination
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param in request.query_params:
+            self.cursor_paginator = self.cursor_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        self.cursor_paginator = None
+        get_count_cache_key = getattr(view, 'get_count_cache_key', None)
+        if get_count_cache_key is not None:
+            self.django_paginator_class = partial(
+                CachedCountPaginator,
+                cache_key=get_count_cache_key(request),
+                approximate=(
+                    settings.RECIPES_COUNT_APPROXIMATE
+                    and not get_filter_params(request)
+                )
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.template.loader import get_template
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+
+from . import reportlab2pdf
+from .html2pdf import render_pdf
+
+SHOPPING_CART_TEMPLATE = 'carttopdf.html'
+
+RENDERERS = ('reportlab', 'xhtml2pdf')
+# Способ генерации на случай ошибки основного, например без шрифта.
+FALLBACK_RENDERER = 'xhtml2pdf'
+
+logger = logging.getLogger(__name__)
+
+_template_versions = {}
+
+
+class PdfRenderError(APIException):
+    """PDF-файл списка покупок не удалось сгенерировать ни одним способом."""
+
+    status_code = 503
+    default_detail = 'Не удалось сгенерировать PDF-файл.'
+    default_code = 'pdf_render_error'
+
+
+def get_template_version(template):
+    """Хэш исходного текста шаблона, вычисляется один раз на процесс."""
+    if template not in _template_versions:
+        source = get_template(template).template.source
+        _template_versions[template] = hashlib.sha256(
+            source.encode()
+        ).hexdigest()
+    return _template_versions[template]
+
+
+def get_layout_version(renderer):
+    """Версия оформления PDF-файла выбранного способа генерации."""
+    if renderer == 'reportlab':
+        return f'reportlab:{reportlab2pdf.LAYOUT_VERSION}'
+    return f'xhtml2pdf:{get_template_version(SHOPPING_CART_TEMPLATE)}'
+
+
+def render(items, renderer):
+    """
+    Генерирует PDF-файл списка покупок средствами ReportLab
+    или, как прежде, из html-шаблона через xhtml2pdf.
+    Ошибку xhtml2pdf сообщает исключением 'PdfRenderError'.
+    """
+    if renderer == 'reportlab':
+        return reportlab2pdf.render_shopping_list(items)
+    content = render_pdf(SHOPPING_CART_TEMPLATE, {'context': items})
+    if content is None:
+        raise PdfRenderError()
+    return content
+
+
+def get_content_hash(items, renderer):
+    """
+    Хэш содержимого списка покупок и версии оформления.
+    Год в подвале файла тоже входит в хэш.
+    """
+    payload = json.dumps(
+        [
+            (item['name'], item['measurement_unit'], item['total'])
+            for item in items
+        ],
+        ensure_ascii=False
+    )
+    return hashlib.sha256('\n'.join((
+        get_layout_version(renderer),
+        str(timezone.now().year),
+        payload
+    )).encode()).hexdigest()
+
+
+def get_path(name):
+    return os.path.join(settings.PDF_CACHE_ROOT, f'{name}.pdf')
+
+
+def store(name, content):
+    """Атомарно записывает файл в хранилище и освобождает место."""
+    os.makedirs(settings.PDF_CACHE_ROOT, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=settings.PDF_CACHE_ROOT)
+    with os.fdopen(fd, 'wb') as tmp:
+        tmp.write(content)
+    os.replace(tmp_path, get_path(name))
+    evict(keep=name)
+
+
+def evict(keep=None):
+    """
+    Удаляет давно не запрашивавшиеся файлы, пока размер хранилища
+    превышает 'PDF_CACHE_MAX_SIZE'. Время последнего обращения к файлу
+    хранится в его дате изменения.
+    """
+    files = []
+    with os.scandir(settings.PDF_CACHE_ROOT) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.endswith('.pdf'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry))
+    total = sum(size for _, size, _ in files)
+    for _, size, entry in sorted(files, key=lambda file: file[0]):
+        if total <= settings.PDF_CACHE_MAX_SIZE:
+            break
+        if entry.name == f'{keep}.pdf':
+            continue
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def touch(name):
+    """Отмечает обращение к файлу. Возвращает False, если файла нет."""
+    try:
+        os.utime(get_path(name))
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def file_response(name, content=None):
+    """
+    Отдаёт файл из хранилища: через nginx заголовком 'X-Accel-Redirect'
+    или, если это отключено, самим приложением. Только что созданный
+    файл отдаётся из памяти.
+    """
+    if settings.PDF_CACHE_ACCEL_REDIRECT:
+        response = HttpResponse(content_type='application/pdf')
+        response['X-Accel-Redirect'] = (
+            f'{settings.PDF_CACHE_ACCEL_PREFIX}{name}.pdf'
+        )
+    elif content is not None:
+        response = HttpResponse(content, content_type='application/pdf')
+    else:
+        response = FileResponse(
+            open(get_path(name), 'rb'), content_type='application/pdf'
+        )
+    response['Content-Disposition'] = 'filename="shopping_cart.pdf"'
+    return response
+
+
+def shopping_cart_pdf(items, renderer=None):
+    """
+    Возвращает ответ с PDF-файлом списка покупок. Файл генерируется
+    только при отсутствии в хранилище файла с тем же содержимым.
+    При ошибке генерации файл создаётся запасным способом
+    FALLBACK_RENDERER и хранится под его ключом, а при ошибке и этого
+    способа вызывается 'PdfRenderError' (ответ 503).
+    """
+    renderer = renderer or settings.SHOPPING_CART_RENDERER
+    items = list(items)
+    name = get_content_hash(items, renderer)
+    if touch(name):
+        try:
+            return file_response(name)
+        except FileNotFoundError:
+            # Файл вытеснен другим процессом после обращения к нему.
+            pass
+    try:
+        content = render(items, renderer)
+    except Exception as error:
+        if renderer == FALLBACK_RENDERER:
+            logger.exception('Ошибка генерации PDF (%s).', renderer)
+            if isinstance(error, PdfRenderError):
+                raise
+            raise PdfRenderError() from error
+        logger.exception(
+            'Ошибка генерации PDF (%s), используется %s.',
+            renderer, FALLBACK_RENDERER
+        )
+        return shopping_cart_pdf(items, FALLBACK_RENDERER)
+    store(name, content)
+    return file_response(name, content)
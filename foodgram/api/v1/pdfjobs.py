@@ -0,0 +1,113 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from head.models import ShoppingCartPdfJob
+
+from .pdfcache import FALLBACK_RENDERER, get_content_hash, store, touch
+from .services import get_shopping_list
+
+
+def create_job(user, renderer=None):
+    """Ставит в очередь генерацию PDF-файла списка покупок."""
+    return ShoppingCartPdfJob.objects.create(
+        user=user, renderer=renderer or settings.SHOPPING_CART_RENDERER
+    )
+
+
+def requeue_stale_jobs():
+    """
+    Возвращает в очередь задачи, зависшие в работе дольше
+    'PDF_JOB_STALE_TIMEOUT' секунд, например после остановки обработчика.
+    """
+    return ShoppingCartPdfJob.objects.filter(
+        status=ShoppingCartPdfJob.RUNNING,
+        updated_at__lt=timezone.now() - timedelta(
+            seconds=settings.PDF_JOB_STALE_TIMEOUT
+        )
+    ).update(status=ShoppingCartPdfJob.PENDING, updated_at=timezone.now())
+
+
+def claim_jobs(limit):
+    """
+    Забирает из очереди до 'limit' задач. Задача достаётся тому
+    обработчику, чьё условное обновление статуса прошло первым,
+    поэтому несколько обработчиков не выполнят её дважды.
+    """
+    claimed = []
+    pending = ShoppingCartPdfJob.objects.filter(
+        status=ShoppingCartPdfJob.PENDING
+    ).values_list('pk', flat=True)[:limit]
+    for pk in pending:
+        if ShoppingCartPdfJob.objects.filter(
+            pk=pk, status=ShoppingCartPdfJob.PENDING
+        ).update(
+            status=ShoppingCartPdfJob.RUNNING, updated_at=timezone.now()
+        ):
+            claimed.append(pk)
+    return list(ShoppingCartPdfJob.objects.filter(
+        pk__in=claimed
+    ).select_related('user'))
+
+
+def prepare_job(job):
+    """
+    Читает список покупок задачи. Возвращает имя файла и строки
+    для генерации или None вместо строк, если такой файл уже есть.
+    """
+    items = list(get_shopping_list(job.user))
+    name = get_content_hash(items, job.renderer)
+    if touch(name):
+        return name, None
+    return name, items
+
+
+def finish_job(job, name, content=None):
+    """
+    Сохраняет результат генерации и завершает задачу. Задачи меняются
+    обновлением по id, чтобы задача, удалённая вместе с пользователем,
+    не прерывала обработчик.
+    """
+    if content is not None:
+        store(name, content)
+    ShoppingCartPdfJob.objects.filter(pk=job.pk).update(
+        status=ShoppingCartPdfJob.DONE, name=name, updated_at=timezone.now()
+    )
+
+
+def fail_job(job, error):
+    ShoppingCartPdfJob.objects.filter(pk=job.pk).update(
+        status=ShoppingCartPdfJob.FAILED, error=error,
+        updated_at=timezone.now()
+    )
+
+
+def fall_back(job):
+    """
+    Возвращает в очередь задачу, которую не удалось выполнить выбранным
+    способом генерации, с запасным способом. Возвращает False, если
+    задача уже выполнялась запасным способом.
+    """
+    if job.renderer == FALLBACK_RENDERER:
+        return False
+    job.renderer = FALLBACK_RENDERER
+    ShoppingCartPdfJob.objects.filter(pk=job.pk).update(
+        renderer=FALLBACK_RENDERER, status=ShoppingCartPdfJob.PENDING,
+        updated_at=timezone.now()
+    )
+    return True
+
+
+def purge_jobs():
+    """
+    Удаляет выполненные и неудавшиеся задачи, завершённые раньше
+    'PDF_JOB_RETENTION' секунд назад. Сами файлы остаются в хранилище
+    и вытесняются по его размеру.
+    """
+    return ShoppingCartPdfJob.objects.filter(
+        status__in=(ShoppingCartPdfJob.DONE, ShoppingCartPdfJob.FAILED),
+        updated_at__lt=timezone.now() - timedelta(
+            seconds=settings.PDF_JOB_RETENTION
+        )
+    ).delete()[0]
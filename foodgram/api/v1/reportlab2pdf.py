@@ -0,0 +1,120 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+# Меняется при изменении оформления, входит в ключ хранилища PDF-файлов.
+LAYOUT_VERSION = '1'
+
+FONT_NAME = 'OpenSans-Medium'
+FONT_PATH = os.path.join('fonts', 'OpenSans-Medium.ttf')
+
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN = 50
+ROW_HEIGHT = 20
+TABLE_TOP = PAGE_HEIGHT - 110
+TABLE_BOTTOM = 130
+COLUMNS = (
+    ('Название', 250),
+    ('Ед. изм.', 120),
+    ('Количество', 120),
+)
+TABLE_WIDTH = sum(width for _, width in COLUMNS)
+TABLE_LEFT = (PAGE_WIDTH - TABLE_WIDTH) / 2
+
+_font_registered = False
+
+
+def register_font():
+    """Регистрирует шрифт списка покупок один раз на процесс."""
+    global _font_registered
+    if not _font_registered:
+        pdfmetrics.registerFont(TTFont(
+            FONT_NAME, os.path.join(settings.STATIC_ROOT, FONT_PATH)
+        ))
+        _font_registered = True
+
+
+def draw_header(pdf):
+    pdf.setFillColor(colors.red)
+    pdf.setFont(FONT_NAME, 20)
+    pdf.drawCentredString(PAGE_WIDTH / 2, PAGE_HEIGHT - 70, 'Список покупок')
+    pdf.setFillColor(colors.black)
+    pdf.setLineWidth(3)
+    pdf.line(MARGIN, PAGE_HEIGHT - 85, PAGE_WIDTH - MARGIN, PAGE_HEIGHT - 85)
+
+
+def draw_footer(pdf, page):
+    pdf.setLineWidth(3)
+    pdf.line(MARGIN, TABLE_BOTTOM - 10, PAGE_WIDTH - MARGIN, TABLE_BOTTOM - 10)
+    pdf.setFont(FONT_NAME, 12)
+    center = PAGE_WIDTH / 2
+    pdf.drawCentredString(center, 95, 'Сервис "Foodgram"')
+    pdf.drawCentredString(center, 80, 'Ваш "Продуктовый помощник"')
+    pdf.drawCentredString(
+        center, 65, f'© {timezone.now().year} Copyright'
+    )
+    pdf.drawCentredString(center, 45, f'Страница - {page}')
+
+
+def fit_text(text, width, size=12):
+    """Обрезает текст, не помещающийся в ячейку."""
+    width -= 10
+    if pdfmetrics.stringWidth(text, FONT_NAME, size) <= width:
+        return text
+    while text and pdfmetrics.stringWidth(
+        text + '…', FONT_NAME, size
+    ) > width:
+        text = text[:-1]
+    return text + '…'
+
+
+def draw_row(pdf, top, values):
+    """Рисует строку таблицы с рамками ячеек."""
+    pdf.setLineWidth(1)
+    left = TABLE_LEFT
+    for value, (_, width) in zip(values, COLUMNS):
+        pdf.rect(left, top - ROW_HEIGHT, width, ROW_HEIGHT)
+        pdf.drawCentredString(
+            left + width / 2, top - ROW_HEIGHT + 6, fit_text(value, width)
+        )
+        left += width
+
+
+def start_page(pdf, page):
+    draw_header(pdf)
+    draw_footer(pdf, page)
+    pdf.setFont(FONT_NAME, 12)
+    draw_row(pdf, TABLE_TOP, [title for title, _ in COLUMNS])
+    return TABLE_TOP - ROW_HEIGHT
+
+
+def render_shopping_list(items):
+    """
+    Рисует PDF-файл списка покупок средствами ReportLab, без разбора
+    HTML и CSS. Возвращает содержимое файла.
+    """
+    register_font()
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    pdf.setTitle('Список покупок')
+    page = 1
+    top = start_page(pdf, page)
+    for item in items:
+        if top - ROW_HEIGHT < TABLE_BOTTOM:
+            pdf.showPage()
+            page += 1
+            top = start_page(pdf, page)
+        draw_row(pdf, top, (
+            item['name'], item['measurement_unit'], str(item['total'])
+        ))
+        top -= ROW_HEIGHT
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
@@ -0,0 +1,258 @@
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from head.models import Ingredient, Recipe
+
+from .caches import INGREDIENTS_SCOPE, get_version
+
+_index_lock = threading.Lock()
+_ingredient_index = None
+
+WORD_RE = re.compile(r'\w+')
+
+# Полнотекстовый индекс рецептов: столбец tsvector с индексом GIN
+# в PostgreSQL и таблица FTS5 в SQLite (см. миграцию 0012_recipe_search).
+RECIPE_TABLE = Recipe._meta.db_table
+RECIPE_FTS_TABLE = 'head_recipe_fts'
+RECIPE_SEARCH_VECTOR = (
+    "setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(text, '')), 'B')"
+)
+
+
+def get_trigrams(text):
+    """
+    Триграммы текста по правилам pg_trgm: каждое слово в нижнем регистре
+    дополняется двумя пробелами в начале и одним в конце.
+    """
+    trigrams = set()
+    for word in WORD_RE.findall(text.lower()):
+        word = f'  {word} '
+        trigrams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return trigrams
+
+
+class IngredientIndex:
+    """
+    Индекс справочника ингредиентов в памяти процесса.
+    Названия хранятся отсортированными, поэтому совпадения по началу
+    названия занимают непрерывный отрезок, найденный двоичным поиском.
+    """
+
+    def __init__(self, ingredients, version=None):
+        self.version = version
+        self.ingredients = sorted(
+            ingredients, key=lambda ingredient: (
+                ingredient.name.lower(), ingredient.pk
+            )
+        )
+        self.names = [
+            ingredient.name.lower() for ingredient in self.ingredients
+        ]
+
+    def search(self, query, limit):
+        """
+        Ингредиенты, название которых начинается с 'query', затем
+        содержащие его в середине, не более 'limit' штук.
+        """
+        query = query.strip().lower()
+        found = []
+        position = bisect_left(self.names, query)
+        while (
+            position < len(self.names)
+            and self.names[position].startswith(query)
+            and len(found) < limit
+        ):
+            found.append(self.ingredients[position])
+            position += 1
+        for ingredient, name in zip(self.ingredients, self.names):
+            if len(found) >= limit:
+                break
+            if query in name and not name.startswith(query):
+                found.append(ingredient)
+        return found
+
+    @cached_property
+    def trigram_index(self):
+        """
+        Номера названий по каждой триграмме и число триграмм
+        каждого названия. Строится при первом нечётком поиске.
+        """
+        postings = defaultdict(list)
+        sizes = []
+        for position, name in enumerate(self.names):
+            trigrams = get_trigrams(name)
+            sizes.append(len(trigrams))
+            for trigram in trigrams:
+                postings[trigram].append(position)
+        return postings, sizes
+
+    def fuzzy_search(self, query, limit, threshold):
+        """
+        Ингредиенты, сходство названия которых с 'query' больше
+        'threshold', по убыванию сходства, не более 'limit' штук.
+        Сходство вычисляется как в pg_trgm: доля общих триграмм
+        в объединении триграмм запроса и названия.
+        """
+        query_trigrams = get_trigrams(query)
+        postings, sizes = self.trigram_index
+        shared = Counter()
+        for trigram in query_trigrams:
+            shared.update(postings.get(trigram, ()))
+        ranked = []
+        for position, count in shared.items():
+            similarity = count / (
+                len(query_trigrams) + sizes[position] - count
+            )
+            if similarity > threshold:
+                ranked.append((-similarity, position))
+        ranked.sort()
+        return [self.ingredients[position] for _, position in ranked[:limit]]
+
+
+def get_ingredient_index():
+    """
+    Индекс ингредиентов текущего процесса. Строится при первом поиске
+    и перестраивается, когда меняется версия области ингредиентов.
+    """
+    global _ingredient_index
+    version = get_version(INGREDIENTS_SCOPE)
+    index = _ingredient_index
+    if index is not None and index.version == version:
+        return index
+    with _index_lock:
+        index = _ingredient_index
+        if index is None or index.version != version:
+            index = IngredientIndex(Ingredient.objects.all(), version)
+            _ingredient_index = index
+    return index
+
+
+def fuzzy_search_ingredients(query, limit):
+    """
+    Нечёткий поиск ингредиентов по сходству триграмм названия:
+    в PostgreSQL - по индексу pg_trgm, в остальных БД - по индексу
+    в памяти процесса. Оператор '%' pg_trgm отбирает названия по своему
+    порогу 'pg_trgm.similarity_threshold' (0.3 по умолчанию), поэтому
+    порог ниже него в PostgreSQL не действует.
+    """
+    threshold = settings.INGREDIENTS_FUZZY_THRESHOLD
+    if connection.vendor != 'postgresql':
+        return get_ingredient_index().fuzzy_search(query, limit, threshold)
+    from django.contrib.postgres.search import TrigramSimilarity
+    return list(Ingredient.objects.filter(
+        name__trigram_similar=query
+    ).annotate(
+        similarity=TrigramSimilarity('name', query)
+    ).filter(
+        similarity__gt=threshold
+    ).order_by('-similarity', 'name', 'pk')[:limit])
+
+
+def update_recipe_search_index(recipe_ids):
+    """Обновляет полнотекстовый индекс названия и описания рецептов."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f'UPDATE {RECIPE_TABLE} '
+                f'SET search_vector = {RECIPE_SEARCH_VECTOR} '
+                'WHERE id = ANY(%s)',
+                [recipe_ids]
+            )
+        elif connection.vendor == 'sqlite':
+            placeholders = ', '.join(['%s'] * len(recipe_ids))
+            cursor.execute(
+                f'INSERT OR REPLACE INTO {RECIPE_FTS_TABLE} '
+                '(rowid, name, text) '
+                f'SELECT id, name, text FROM {RECIPE_TABLE} '
+                f'WHERE id IN ({placeholders})',
+                recipe_ids
+            )
+
+
+def delete_recipe_search_index(recipe_ids):
+    """
+    Удаляет рецепты из индекса SQLite. В PostgreSQL индекс хранится
+    в строке рецепта и удаляется вместе с ней.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids or connection.vendor != 'sqlite':
+        return
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {RECIPE_FTS_TABLE} WHERE rowid IN ({placeholders})',
+            recipe_ids
+        )
+
+
+def rebuild_recipe_search_index():
+    """
+    Перестраивает полнотекстовый индекс всех рецептов, например после
+    массовой вставки через bulk_create, которая не вызывает сигналов.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f'UPDATE {RECIPE_TABLE} '
+                f'SET search_vector = {RECIPE_SEARCH_VECTOR}'
+            )
+        elif connection.vendor == 'sqlite':
+            cursor.execute(f'DELETE FROM {RECIPE_FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {RECIPE_FTS_TABLE} (rowid, name, text) '
+                f'SELECT id, name, text FROM {RECIPE_TABLE}'
+            )
+
+
+def get_fts_query(query):
+    """
+    Запрос FTS5 из слов строки поиска: все слова обязательны и ищутся
+    по началу, что в отсутствие русского стеммера в SQLite находит
+    и другие формы слова ('борщ' - 'борща', 'борщом').
+    """
+    return ' '.join(f'"{word}"*' for word in WORD_RE.findall(query))
+
+
+def search_recipes(queryset, query):
+    """
+    Полнотекстовый поиск рецептов по названию и описанию с сортировкой
+    по релевантности (совпадения в названии весят больше) и затем
+    по новизне. В PostgreSQL - по столбцу tsvector с русской морфологией,
+    в SQLite - по таблице FTS5, в остальных БД - по вхождению подстроки.
+    """
+    if connection.vendor == 'postgresql':
+        tsquery = "plainto_tsquery('russian', %s)"
+        return queryset.extra(
+            select={'search_rank': (
+                f'ts_rank({RECIPE_TABLE}.search_vector, {tsquery})'
+            )},
+            select_params=(query,),
+            where=[f'{RECIPE_TABLE}.search_vector @@ {tsquery}'],
+            params=(query,)
+        ).order_by('-search_rank', '-id')
+    if connection.vendor == 'sqlite':
+        fts_query = get_fts_query(query)
+        if not fts_query:
+            return queryset.none()
+        # bm25 тем меньше, чем документ релевантнее; вес названия выше.
+        return queryset.extra(
+            select={'search_rank': f'-bm25({RECIPE_FTS_TABLE}, 4.0, 1.0)'},
+            tables=[RECIPE_FTS_TABLE],
+            where=[
+                f'{RECIPE_FTS_TABLE}.rowid = {RECIPE_TABLE}.id',
+                f'{RECIPE_FTS_TABLE} MATCH %s',
+            ],
+            params=(fts_query,)
+        ).order_by('-search_rank', '-id')
+    return queryset.filter(Q(name__icontains=query) | Q(text__icontains=query))
@@ -2,14 +2,20 @@ import base64
 
 from django.contrib.auth import get_user_model
 from django.core.files.base import ContentFile
-from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
 from head.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
-                         ShoppingCart, Tag, TagRecipe)
+                         ShoppingCart, ShoppingCartPdfJob, Tag, TagRecipe,
+                         get_recipe_update_fields, get_tag_mask)
 from users.serializers import UserSerializer
 
+from .mixins import SparseFieldsMixin
+from .paginators import CustomPagination
+from .services import change_recipe_ingredients
+
 User = get_user_model()
 
 
@@ -79,27 +85,95 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('author', 'ingredients',)
 
+    def validate_ingredients(self, value):
+        """
+        Проверяет отсутствие повторов и существование всех ингредиентов
+        одним запросом.
+        """
+        ids = {item['id'] for item in value}
+        if len(ids) != len(value):
+            raise serializers.ValidationError(
+                'Ингредиенты в рецепте не должны повторяться.'
+            )
+        missing = sorted(ids - set(Ingredient.objects.in_bulk(ids)))
+        if missing:
+            raise serializers.ValidationError(
+                'Ингредиенты не найдены: {}.'.format(
+                    ', '.join(map(str, missing))
+                )
+            )
+        return value
+
     def to_representation(self, value):
+        prefetch_related_objects(
+            [value],
+            'tags',
+            Prefetch(
+                'ingredientrecipe_set',
+                queryset=IngredientRecipe.objects.select_related('ingredient')
+            )
+        )
         return RecipeSerializer(value, context=self.context).data
 
+    def create_ingredients(self, recipe, ingredient_list):
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(
+                ingredient_id=item['id'],
+                recipe=recipe,
+                amount=item['amount']
+            )
+            for item in ingredient_list
+        )
+
+    def update_ingredients(self, recipe, ingredient_list):
+        """
+        Сравнивает новый список ингредиентов с сохранёнными и изменяет
+        только отличающиеся строки. Изменения количеств передаются в
+        списки покупок; удаление строк учитывается сигналом.
+        """
+        current = {
+            row.ingredient_id: row
+            for row in IngredientRecipe.objects.filter(recipe=recipe)
+        }
+        amounts = {item['id']: item['amount'] for item in ingredient_list}
+        removed = [
+            row.pk for ingredient_id, row in current.items()
+            if ingredient_id not in amounts
+        ]
+        if removed:
+            IngredientRecipe.objects.filter(pk__in=removed).delete()
+        deltas = {}
+        changed = []
+        for ingredient_id, row in current.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and amount != row.amount:
+                deltas[ingredient_id] = amount - row.amount
+                row.amount = amount
+                changed.append(row)
+        if changed:
+            IngredientRecipe.objects.bulk_update(changed, ['amount'])
+        created = [
+            item for item in ingredient_list if item['id'] not in current
+        ]
+        self.create_ingredients(recipe, created)
+        deltas.update((item['id'], item['amount']) for item in created)
+        change_recipe_ingredients(recipe.pk, deltas)
+
+    @transaction.atomic
     def create(self, validated_data):
         tags_list = validated_data.pop('tags')
         ingredient_list = validated_data.pop('ingredients')
-        recipe = Recipe.objects.create(**validated_data)
-        for item in ingredient_list:
-            ingredient = get_object_or_404(Ingredient, id=item.get('id'))
-            IngredientRecipe.objects.create(
-                ingredient=ingredient,
-                recipe=recipe,
-                amount=item.get('amount')
-            )
-        for item in tags_list:
-            TagRecipe.objects.create(
-                tag=item,
-                recipe=recipe
-            )
+        recipe = Recipe.objects.create(
+            tag_mask=get_tag_mask(tag.pk for tag in tags_list),
+            **validated_data
+        )
+        self.create_ingredients(recipe, ingredient_list)
+        TagRecipe.objects.bulk_create(
+            TagRecipe(tag=tag, recipe=recipe) for tag in tags_list
+        )
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         if validated_data.get('image') is not None:
             instance.image = validated_data.pop('image')
@@ -109,27 +183,20 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
         tags_list = validated_data.pop('tags')
         instance.tags.set(tags_list)
+        instance.tag_mask = get_tag_mask(tag.pk for tag in tags_list)
 
         ingredient_list = validated_data.pop('ingredients')
-        instance.ingredients.clear()
-        for item in ingredient_list:
-            ingredient = get_object_or_404(Ingredient, id=item.get('id'))
-            instance.ingredients.add(
-                ingredient,
-                through_defaults={'amount': item.get('amount')}
-            )
+        self.update_ingredients(instance, ingredient_list)
 
-        instance.save()
+        instance.save(update_fields=get_recipe_update_fields())
         return instance
 
 
-class RecipeSerializer(serializers.ModelSerializer):
-    """Сериализатор для списка рецептов."""
-
-    def __init__(self, *args, **kwargs):
-        super(RecipeSerializer, self).__init__(*args, **kwargs)
-        request = self.context.get('request')
-        self.fields['author'].context['request'] = request
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """
+    Сериализатор для списка рецептов.
+    Набор полей ограничивается параметрами запроса 'fields' и 'omit'.
+    """
 
     tags = TagSerializer(many=True)
     author = UserSerializer(read_only=True)
@@ -157,11 +224,59 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     def get_is_favorited(self, obj):
         user = self.context['request'].user
-        return user.is_authenticated and bool(obj.lover.filter(user=user))
+        if not user.is_authenticated:
+            return False
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+        return obj.lover.filter(user=user).exists()
 
     def get_is_in_shopping_cart(self, obj):
         user = self.context['request'].user
-        return user.is_authenticated and bool(obj.buyer.filter(user=user))
+        if not user.is_authenticated:
+            return False
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+        return obj.buyer.filter(user=user).exists()
+
+
+class RecipeCoverageSerializer(RecipeSerializer):
+    """
+    Сериализатор рецептов, подобранных по имеющимся ингредиентам:
+    'coverage' - доля ингредиентов рецепта, которые есть у пользователя.
+    """
+
+    coverage = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('coverage',)
+
+
+class CookParamsSerializer(serializers.Serializer):
+    """Параметры подбора рецептов по имеющимся ингредиентам."""
+
+    ingredients = serializers.CharField(source='ingredient_ids')
+    min_coverage = serializers.FloatField(
+        min_value=0, max_value=1, default=0
+    )
+    limit = serializers.IntegerField(
+        min_value=1, max_value=CustomPagination.max_page_size,
+        default=CustomPagination.page_size
+    )
+
+    def validate_ingredients(self, value):
+        try:
+            ingredient_ids = {
+                int(item) for item in value.split(',') if item.strip()
+            }
+        except ValueError:
+            raise serializers.ValidationError(
+                'Укажите id ингредиентов через запятую.'
+            )
+        if not ingredient_ids:
+            raise serializers.ValidationError(
+                'Укажите хотя бы один ингредиент.'
+            )
+        return ingredient_ids
 
 
 class FavoriteShoppingSerializer(serializers.ModelSerializer):
@@ -215,3 +330,24 @@ class ShoppingCreateSerializer(serializers.ModelSerializer):
                 message='Этот рецепт уже есть в Вашем списке.'
             )
         ]
+
+
+class ShoppingListSerializer(serializers.Serializer):
+    """Сериализатор для суммарного списка ингредиентов к покупке."""
+
+    id = serializers.IntegerField(source='ingredient')
+    name = serializers.CharField()
+    measurement_unit = serializers.CharField()
+    amount = serializers.IntegerField(source='total')
+
+
+class ShoppingCartPdfJobSerializer(serializers.ModelSerializer):
+    """Сериализатор для задач фоновой генерации PDF-файла."""
+
+    url = serializers.HyperlinkedIdentityField(
+        view_name='api:api:shopping_cart_jobs-detail'
+    )
+
+    class Meta:
+        model = ShoppingCartPdfJob
+        fields = ('id', 'url', 'status', 'renderer', 'error', 'created_at')
@@ -0,0 +1,210 @@
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from head.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                         ShoppingCart, ShoppingListItem)
+
+from .caches import INGREDIENTS_SCOPE, bump_version_on_commit
+
+User = get_user_model()
+
+
+def aggregate_shopping_list(user):
+    """
+    Суммирует ингредиенты рецептов из списка покупок пользователя.
+    Строки рецептов с ингредиентами соединяются со списком покупок и
+    справочником ингредиентов по одному разу и группируются по
+    ингредиенту, поэтому количество строк не растёт с числом рецептов.
+    """
+    return IngredientRecipe.objects.filter(
+        recipe__in=ShoppingCart.objects.filter(user=user).values('recipe')
+    ).values('ingredient').annotate(
+        name=F('ingredient__name'),
+        measurement_unit=F('ingredient__measurement_unit'),
+        total=Sum('amount')
+    ).order_by('name', 'ingredient')
+
+
+def get_shopping_list(user):
+    """
+    Список покупок пользователя из поддерживаемой таблицы
+    'ShoppingListItem' - одно чтение по индексу без агрегации.
+    """
+    return ShoppingListItem.objects.filter(user=user).values(
+        'ingredient'
+    ).annotate(
+        name=F('ingredient__name'),
+        measurement_unit=F('ingredient__measurement_unit'),
+        total=F('amount')
+    ).order_by('name', 'ingredient')
+
+
+@transaction.atomic
+def change_shopping_lists(user_ids, deltas):
+    """
+    Изменяет количество ингредиентов в списках покупок пользователей.
+    'deltas' - словарь {id ингредиента: изменение количества}.
+    Строки с неположительным итогом удаляются.
+    """
+    user_ids = sorted(set(user_ids))
+    deltas = {key: value for key, value in deltas.items() if value}
+    if not user_ids or not deltas:
+        return
+    # Блокировка пользователей упорядочивает параллельные изменения
+    # их списков, в том числе вставку недостающих строк.
+    list(User.objects.select_for_update().filter(
+        pk__in=user_ids
+    ).order_by('pk').values_list('pk', flat=True))
+    items = {
+        (item.user_id, item.ingredient_id): item
+        for item in ShoppingListItem.objects.filter(
+            user__in=user_ids, ingredient__in=deltas
+        )
+    }
+    changed, removed, created = [], [], []
+    for item in items.values():
+        item.amount += deltas[item.ingredient_id]
+        if item.amount > 0:
+            changed.append(item)
+        else:
+            removed.append(item.pk)
+    for user_id in user_ids:
+        for ingredient_id, delta in deltas.items():
+            if delta > 0 and (user_id, ingredient_id) not in items:
+                created.append(ShoppingListItem(
+                    user_id=user_id, ingredient_id=ingredient_id, amount=delta
+                ))
+    if changed:
+        ShoppingListItem.objects.bulk_update(changed, ['amount'])
+    if removed:
+        ShoppingListItem.objects.filter(pk__in=removed).delete()
+    ShoppingListItem.objects.bulk_create(created)
+
+
+def get_recipe_amounts(recipe_id, sign=1):
+    """Количества ингредиентов рецепта в виде словаря изменений."""
+    amounts = Counter()
+    for ingredient_id, amount in IngredientRecipe.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('ingredient', 'amount'):
+        amounts[ingredient_id] += sign * amount
+    return amounts
+
+
+def add_to_shopping_list(user_id, recipe_id):
+    """Учитывает добавление рецепта в список покупок."""
+    change_shopping_lists([user_id], get_recipe_amounts(recipe_id))
+
+
+def remove_from_shopping_list(user_id, recipe_id):
+    """Учитывает удаление рецепта из списка покупок."""
+    change_shopping_lists([user_id], get_recipe_amounts(recipe_id, -1))
+
+
+def change_recipe_ingredients(recipe_id, deltas):
+    """
+    Учитывает изменение ингредиентов рецепта в списках покупок
+    всех пользователей, добавивших его в список.
+    """
+    if not any(deltas.values()):
+        return
+    change_shopping_lists(
+        ShoppingCart.objects.filter(
+            recipe_id=recipe_id
+        ).values_list('user', flat=True),
+        deltas
+    )
+
+
+@transaction.atomic
+def rebuild_shopping_lists(users=None, batch_size=1000):
+    """
+    Пересчитывает таблицу 'ShoppingListItem' по спискам покупок
+    заданных пользователей (по умолчанию - всех).
+    Возвращает количество созданных строк.
+    """
+    items = ShoppingListItem.objects.all()
+    carts = ShoppingCart.objects.filter(
+        recipe__ingredientrecipe__isnull=False
+    )
+    if users is not None:
+        items = items.filter(user__in=users)
+        carts = carts.filter(user__in=users)
+    items.delete()
+    totals = carts.values(
+        'user', 'recipe__ingredientrecipe__ingredient'
+    ).annotate(
+        total=Sum('recipe__ingredientrecipe__amount')
+    ).order_by().values_list(
+        'user', 'recipe__ingredientrecipe__ingredient', 'total'
+    )
+    batch, created = [], 0
+    for user_id, ingredient_id, total in totals.iterator():
+        batch.append(ShoppingListItem(
+            user_id=user_id, ingredient_id=ingredient_id, amount=total
+        ))
+        if len(batch) >= batch_size:
+            ShoppingListItem.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+    ShoppingListItem.objects.bulk_create(batch)
+    return created + len(batch)
+
+
+def normalize_ingredient(name, measurement_unit):
+    """Убирает лишние пробелы в названии и единице измерения."""
+    return ' '.join(name.split()), ' '.join(measurement_unit.split())
+
+
+@transaction.atomic
+def import_ingredients(rows, batch_size=1000):
+    """
+    Добавляет в справочник ингредиенты из пар (название, единица
+    измерения), которых в нём ещё нет. Сравнение без учёта регистра,
+    повторы в 'rows' пропускаются. Строки читаются по мере вставки
+    пачками по 'batch_size'. Возвращает количество прочитанных
+    и добавленных ингредиентов.
+    """
+    seen = {
+        (name.lower(), measurement_unit.lower())
+        for name, measurement_unit in Ingredient.objects.values_list(
+            'name', 'measurement_unit'
+        ).iterator()
+    }
+    batch, read, created = [], 0, 0
+    for row in rows:
+        read += 1
+        name, measurement_unit = normalize_ingredient(*row)
+        key = (name.lower(), measurement_unit.lower())
+        if not name or not measurement_unit or key in seen:
+            continue
+        seen.add(key)
+        batch.append(
+            Ingredient(name=name, measurement_unit=measurement_unit)
+        )
+        if len(batch) >= batch_size:
+            Ingredient.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+    Ingredient.objects.bulk_create(batch)
+    created += len(batch)
+    if created:
+        # bulk_create не отправляет сигналы сохранения.
+        bump_version_on_commit(INGREDIENTS_SCOPE)
+    return read, created
+
+
+def rebuild_favorites_counts():
+    """
+    Пересчитывает счётчики избранного всех рецептов одним UPDATE,
+    например после вставки строк 'Favorite' без сигналов.
+    """
+    Recipe.objects.update(favorites_count=Coalesce(Subquery(
+        Favorite.objects.filter(recipe=OuterRef('pk')).order_by().values(
+            'recipe'
+        ).annotate(count=Count('pk')).values('count')
+    ), 0))
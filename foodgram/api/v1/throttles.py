@@ -0,0 +1,111 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle, ScopedRateThrottle
+
+from .caches import LOCK_KEY
+
+CONCURRENCY_KEY = 'throttle_concurrency_{}_{}'
+
+
+class TokenBucketThrottle(ScopedRateThrottle):
+    """
+    Ограничивает частоту запросов пользователя к представлению
+    алгоритмом 'token bucket'. Частота задаётся для значения
+    'throttle_scope' представления в 'DEFAULT_THROTTLE_RATES':
+    при частоте '10/min' допускается всплеск из 10 запросов, после
+    чего запросы пропускаются по одному в 6 секунд.
+    Корзина читается и записывается под блокировкой в кэше, чтобы
+    одновременные запросы пользователя не потратили один жетон; запрос,
+    не дождавшийся блокировки за 'THROTTLE_LOCK_WAIT', отклоняется.
+    """
+
+    cache_format = 'throttle_bucket_%(scope)s_%(ident)s'
+
+    def get_rate(self):
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, self.scope_attr, None)
+        self.rate = self.get_rate() if self.scope else None
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        self.key = self.get_cache_key(request, view)
+        self.tokens = 0
+        lock_key = LOCK_KEY.format(self.key)
+        if not acquire_lock(lock_key):
+            return False
+        try:
+            now = self.timer()
+            tokens, updated = self.cache.get(
+                self.key, (self.num_requests, now)
+            )
+            self.tokens = min(
+                self.num_requests,
+                tokens + (now - updated) * self.num_requests / self.duration
+            )
+            if self.tokens < 1:
+                return False
+            self.cache.set(self.key, (self.tokens - 1, now), self.duration)
+            return True
+        finally:
+            cache.delete(lock_key)
+
+    def wait(self):
+        return (1 - self.tokens) * self.duration / self.num_requests
+
+
+def acquire_lock(key):
+    """
+    Занимает блокировку в кэше, ожидая её не дольше 'THROTTLE_LOCK_WAIT'.
+    Блокировка процесса, завершившегося аварийно, истекает
+    через 'THROTTLE_LOCK_TIMEOUT'.
+    """
+    deadline = time.monotonic() + settings.THROTTLE_LOCK_WAIT
+    while not cache.add(key, True, settings.THROTTLE_LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(settings.THROTTLE_LOCK_POLL_INTERVAL)
+    return True
+
+
+class ConcurrencyThrottle(BaseThrottle):
+    """
+    Ограничивает число одновременно выполняемых запросов к представлению
+    всеми пользователями. Предел задаётся для значения 'throttle_scope'
+    представления в 'CONCURRENCY_LIMITS'. Каждое место - отдельный ключ
+    кэша, который занимается атомарным 'add': место освобождается
+    в 'ConcurrencyLimitMixin.finalize_response' (для потоковых ответов -
+    при закрытии ответа), а при аварийном завершении процесса - по
+    истечении 'CONCURRENCY_SLOT_TIMEOUT', не затрагивая остальные места.
+    """
+
+    scope_attr = 'throttle_scope'
+
+    def allow_request(self, request, view):
+        scope = getattr(view, self.scope_attr, None)
+        limit = settings.CONCURRENCY_LIMITS.get(scope)
+        if limit is None:
+            return True
+        for slot in range(limit):
+            key = CONCURRENCY_KEY.format(scope, slot)
+            if cache.add(key, 1, settings.CONCURRENCY_SLOT_TIMEOUT):
+                view.concurrency_slots = getattr(
+                    view, 'concurrency_slots', []
+                )
+                view.concurrency_slots.append(key)
+                return True
+        return False
+
+    def wait(self):
+        return settings.CONCURRENCY_RETRY_AFTER
+
+
+def release_slots(view):
+    """Освобождает места, занятые запросом к представлению."""
+    for key in getattr(view, 'concurrency_slots', ()):
+        cache.delete(key)
+    view.concurrency_slots = []
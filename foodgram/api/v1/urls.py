@@ -1,7 +1,8 @@
 from django.urls import include, path
 from rest_framework import routers
 
-from .views import IngredientViewSet, RecipeViewSet, TagViewSet
+from .views import (IngredientViewSet, RecipeViewSet,
+                    ShoppingCartPdfJobViewSet, TagViewSet)
 
 app_name = 'api'
 
@@ -9,6 +10,10 @@ router = routers.DefaultRouter()
 
 router.register(r'ingredients', IngredientViewSet, basename='ingredients')
 router.register(r'recipes', RecipeViewSet, basename='recipes')
+router.register(
+    r'shopping_cart_jobs', ShoppingCartPdfJobViewSet,
+    basename='shopping_cart_jobs'
+)
 router.register(r'tags', TagViewSet, basename='tags')
 
 urlpatterns = [
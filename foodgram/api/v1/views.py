@@ -1,21 +1,42 @@
-from django.db.models import Sum
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Exists, OuterRef, Prefetch
+from django.shortcuts import redirect
+from django.urls import reverse
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import serializers, status, viewsets
+from rest_framework import mixins, serializers, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.filters import SearchFilter
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
-from head.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from head.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                         ShoppingCart, ShoppingCartPdfJob, Subscription, Tag)
 
-from .filters import RecipeFilter
-from .html2pdf import html_to_pdf
+from .caches import (FAVORITES_SCOPE, INGREDIENTS_SCOPE, RECIPE_SCOPE,
+                     RECIPES_CONTENT_SCOPE, RECIPES_SCOPE, SHOPPING_CART_SCOPE,
+                     SUBSCRIPTIONS_SCOPE, TAGS_SCOPE, get_count_cache_key,
+                     get_ordering_scopes)
+from .cooking import forget_recipes, get_cooking_index
+from .exports import FORMATS, ExportContentNegotiation, stream_shopping_list
+from .filters import IngredientSearchFilter, RecipeFilter, RecipeSearchFilter
+from .mixins import (AnonymousResponseCacheMixin, ConcurrencyLimitMixin,
+                     ConditionalGetMixin, RenderedResponseCacheMixin,
+                     get_requested_fields)
 from .paginators import CustomPagination
+from .pdfcache import RENDERERS, file_response, shopping_cart_pdf, touch
+from .pdfjobs import create_job
 from .permissions import IsAuthorOrAdminOnlyPermission
-from .serializers import (FavoriteCreateSerializer, FavoriteShoppingSerializer,
-                          IngredientSerializer, RecipeCreateSerializer,
-                          RecipeSerializer, ShoppingCreateSerializer,
+from .serializers import (CookParamsSerializer, FavoriteCreateSerializer,
+                          FavoriteShoppingSerializer, IngredientSerializer,
+                          RecipeCoverageSerializer, RecipeCreateSerializer,
+                          RecipeSerializer, ShoppingCartPdfJobSerializer,
+                          ShoppingCreateSerializer, ShoppingListSerializer,
                           TagSerializer)
+from .services import get_shopping_list
+from .throttles import ConcurrencyThrottle, TokenBucketThrottle
+
+User = get_user_model()
 
 
 def custom_post_delete(self, request, pk, func_model):
@@ -45,29 +66,112 @@ def custom_post_delete(self, request, pk, func_model):
     return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConcurrencyLimitMixin, ConditionalGetMixin,
+                    AnonymousResponseCacheMixin, viewsets.ModelViewSet):
     """
     Представление для рецептов, обрабатывающее GET, POST,
     PATCH, DELETE - запросы. Кроме этого, запросы POST, DELETE для
     изменения 'списка покупок' и 'списка избранных рецептов' пользователя.
-    Также обрабатывает GET-запрос на скачивание списка покупок в PDF-файле.
+    Также обрабатывает GET-запросы на скачивание списка покупок в PDF-файле
+    и на получение того же списка в формате JSON.
     Настроена пагинация, устанавливать количество рецептов на страницу
     можно по параметру 'limit' (по умолчанию - 10 рецетов на страницу).
     Имеется возможность фильтровать результаты поиска по нескольким критериям:
     по автору рецепта, по тегу (slug-поле), по наличию рецепта в 'списке
-    покупок' или 'списке избранного' у текущего пользователя.
+    покупок' или 'списке избранного' у текущего пользователя, по времени
+    приготовления, а также искать рецепты по названию и описанию
+    (параметр 'search'). Параметр 'ordering' сортирует рецепты по новизне,
+    времени приготовления или популярности.
+    Подбирает рецепты по имеющимся у пользователя ингредиентам.
+    Ответы анонимным пользователям кэшируются, поддерживаются
+    условные запросы по заголовкам 'ETag' и 'Last-Modified'.
+    Число одновременных запросов и их частота ограничиваются
+    настройками областей 'recipes' и 'download_shopping_cart'.
     """
 
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     pagination_class = CustomPagination
-    filter_backends = (DjangoFilterBackend,)
+    filter_backends = (DjangoFilterBackend, RecipeSearchFilter)
     filterset_class = RecipeFilter
     http_method_names = ['get', 'post', 'patch', 'delete']
+    throttle_classes = (ConcurrencyThrottle, TokenBucketThrottle)
+    throttle_scope = 'recipes'
+
+    def get_queryset(self):
+        """
+        Для чтения рецептов заранее подгружает связанные объекты и
+        вычисляет флаги текущего пользователя подзапросами, чтобы
+        количество запросов к БД не зависело от размера страницы.
+        Не запрошенные параметрами 'fields' и 'omit' поля не загружаются.
+        """
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve', 'cook'):
+            return queryset
+        fields = get_requested_fields(
+            self.request, RecipeSerializer.Meta.fields
+        )
+        if 'text' not in fields:
+            queryset = queryset.defer('text')
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(**{
+                name: Exists(model.objects.filter(
+                    recipe=OuterRef('pk'), user=user
+                ))
+                for name, model in (
+                    ('is_favorited', Favorite),
+                    ('is_in_shopping_cart', ShoppingCart)
+                )
+                if name in fields
+            })
+        return queryset.prefetch_related(
+            *self.get_prefetches(fields, user)
+        )
+
+    def get_prefetches(self, fields, user):
+        prefetches = []
+        if 'tags' in fields:
+            prefetches.append('tags')
+        if 'ingredients' in fields:
+            prefetches.append(Prefetch(
+                'ingredientrecipe_set',
+                queryset=IngredientRecipe.objects.select_related('ingredient')
+            ))
+        if 'author' in fields:
+            authors = User.objects.all()
+            if user.is_authenticated:
+                authors = authors.annotate(
+                    is_subscribed=Exists(Subscription.objects.filter(
+                        author=OuterRef('pk'), user=user
+                    ))
+                )
+            prefetches.append(Prefetch('author', queryset=authors))
+        return prefetches
+
+    def get_condition_scopes(self, request):
+        if self.action == 'retrieve':
+            scopes = [RECIPE_SCOPE.format(self.kwargs['pk'])]
+        else:
+            scopes = [RECIPES_SCOPE, *get_ordering_scopes(request)]
+        scopes.append(RECIPES_CONTENT_SCOPE)
+        user = request.user
+        if user.is_authenticated:
+            scopes += [
+                scope.format(user.pk) for scope in (
+                    FAVORITES_SCOPE, SHOPPING_CART_SCOPE, SUBSCRIPTIONS_SCOPE
+                )
+            ]
+        return scopes
+
+    def get_count_cache_key(self, request):
+        return get_count_cache_key(request)
 
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
             return RecipeSerializer
+        if self.action == 'cook':
+            return RecipeCoverageSerializer
         if self.action == 'favorite':
             return FavoriteCreateSerializer
         if self.action == 'shopping_cart':
@@ -75,7 +179,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return RecipeCreateSerializer
 
     def get_permissions(self):
-        if self.action in ('list', 'retrieve'):
+        if self.action in ('list', 'retrieve', 'cook'):
             self.permission_classes = (AllowAny,)
         elif self.action in ('favorite', 'shopping_cart'):
             self.permission_classes = (IsAuthenticated,)
@@ -88,16 +192,99 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def get_renderer_param(self, request):
+        renderer = request.query_params.get('renderer')
+        if renderer is not None and renderer not in RENDERERS:
+            raise serializers.ValidationError(
+                {
+                    'renderer': [
+                        'Допустимые значения: {}.'.format(', '.join(RENDERERS))
+                    ]
+                }
+            )
+        return renderer
+
     @action(
-        methods=['get'], detail=False,
+        methods=['get', 'post'], detail=False,
+        content_negotiation_class=ExportContentNegotiation,
+        throttle_scope='download_shopping_cart'
     )
     def download_shopping_cart(self, request):
-        user = self.request.user
-        context = user.buy.values(
-            'recipe__ingredients__name',
-            'recipe__ingredients__measurement_unit'
-        ).annotate(total=Sum('recipe__ingredientrecipe__amount'))
-        return html_to_pdf('carttopdf.html', {'context': context})
+        """
+        GET отдаёт файл списка покупок сразу. POST ставит генерацию
+        PDF-файла в очередь и возвращает адрес задачи.
+        """
+        if request.method == 'POST':
+            job = create_job(request.user, self.get_renderer_param(request))
+            serializer = ShoppingCartPdfJobSerializer(
+                job, context=self.get_serializer_context()
+            )
+            return Response(
+                serializer.data,
+                status=status.HTTP_202_ACCEPTED,
+                headers={'Location': serializer.data['url']}
+            )
+        export_format = request.query_params.get('format', 'pdf')
+        if export_format not in FORMATS:
+            raise serializers.ValidationError(
+                {
+                    'format': [
+                        'Допустимые значения: {}.'.format(', '.join(FORMATS))
+                    ]
+                }
+            )
+        if export_format != 'pdf':
+            return stream_shopping_list(
+                get_shopping_list(request.user), export_format
+            )
+        return shopping_cart_pdf(
+            get_shopping_list(request.user), self.get_renderer_param(request)
+        )
+
+    @action(
+        methods=['get'], detail=False,
+    )
+    def cook(self, request):
+        """
+        Рецепты, которые можно приготовить из ингредиентов 'ingredients'
+        (id через запятую), по убыванию доли имеющихся ингредиентов
+        рецепта. Подбираются по индексу в памяти процесса.
+        """
+        params = CookParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        for _ in range(settings.COOKING_SEARCH_ATTEMPTS):
+            ranked = get_cooking_index().search(**params.validated_data)
+            recipes = self.get_queryset().in_bulk(
+                [recipe_id for recipe_id, _ in ranked]
+            )
+            missing = [
+                recipe_id for recipe_id, _ in ranked
+                if recipe_id not in recipes
+            ]
+            if not missing:
+                break
+            # Удалённые рецепты исключаются из индекса, и поиск
+            # повторяется, чтобы добрать до 'limit' рецептов.
+            forget_recipes(missing)
+        results = []
+        for recipe_id, coverage in ranked:
+            # Индекс, построенный в фоне до удаления рецепта, может
+            # снова его содержать: такие рецепты пропускаются.
+            if recipe_id in recipes:
+                recipe = recipes[recipe_id]
+                recipe.coverage = coverage
+                results.append(recipe)
+        serializer = self.get_serializer(results, many=True)
+        return Response(serializer.data)
+
+    @action(
+        methods=['get'], detail=False,
+    )
+    def shopping_list(self, request):
+        serializer = ShoppingListSerializer(
+            get_shopping_list(request.user), many=True
+        )
+        return Response(serializer.data)
 
     @action(
         methods=['post', 'delete'], detail=True,
@@ -114,22 +301,75 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return custom_post_delete(self, request, pk, func_model)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
-    """Представление для тегов, обрабатывающее только безопасные запросы."""
+class TagViewSet(ConditionalGetMixin, RenderedResponseCacheMixin,
+                 viewsets.ReadOnlyModelViewSet):
+    """
+    Представление для тегов, обрабатывающее только безопасные запросы.
+    Поддерживаются условные запросы по заголовкам 'ETag' и 'Last-Modified'.
+    Готовые ответы хранятся в памяти процесса до изменения тегов.
+    """
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
+    public_cache = True
 
+    def get_condition_scopes(self, request):
+        return (TAGS_SCOPE,)
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+
+class IngredientViewSet(ConditionalGetMixin, RenderedResponseCacheMixin,
+                        viewsets.ReadOnlyModelViewSet):
     """
     Представление для ингредиентов, обрабатывающее только безопасные запросы.
-    Доступен поиск ингредиентов по названию.
+    Доступен поиск ингредиентов по названию по индексу в памяти.
+    Поддерживаются условные запросы по заголовкам 'ETag' и 'Last-Modified'.
+    Готовые ответы без поиска хранятся в памяти процесса
+    до изменения справочника.
     """
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny,)
-    filter_backends = (SearchFilter,)
-    search_fields = ('^name', 'name')
+    public_cache = True
+    filter_backends = (IngredientSearchFilter,)
+
+    def get_condition_scopes(self, request):
+        return (INGREDIENTS_SCOPE,)
+
+
+class ShoppingCartPdfJobViewSet(mixins.RetrieveModelMixin,
+                                viewsets.GenericViewSet):
+    """
+    Представление задач фоновой генерации PDF-файла списка покупок.
+    Пока задача выполняется, отдаётся её состояние с кодом 202,
+    по готовности - перенаправление на файл.
+    """
+
+    serializer_class = ShoppingCartPdfJobSerializer
+
+    def get_queryset(self):
+        return ShoppingCartPdfJob.objects.filter(user=self.request.user)
+
+    def retrieve(self, request, *args, **kwargs):
+        job = self.get_object()
+        if job.status == ShoppingCartPdfJob.DONE:
+            return redirect(
+                reverse('api:api:shopping_cart_jobs-file', args=(job.pk,)),
+                permanent=False
+            )
+        serializer = self.get_serializer(job)
+        if job.status == ShoppingCartPdfJob.FAILED:
+            return Response(serializer.data)
+        return Response(
+            serializer.data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Retry-After': settings.PDF_JOB_POLL_INTERVAL}
+        )
+
+    @action(methods=['get'], detail=True)
+    def file(self, request, pk):
+        job = self.get_object()
+        if job.status != ShoppingCartPdfJob.DONE or not touch(job.name):
+            raise NotFound('Файл не готов или удалён из хранилища.')
+        return file_response(job.name)
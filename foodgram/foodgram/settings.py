@@ -95,6 +95,16 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+    }
+}
+
 STATIC_URL = '/static/'
 
 # STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static/'),)
@@ -153,7 +163,66 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.TokenAuthentication',
     ],
     'SEARCH_PARAM': 'name',
+    # Частоты запросов пользователя для 'TokenBucketThrottle'
+    # по значениям 'throttle_scope' представлений.
+    'DEFAULT_THROTTLE_RATES': {
+        'download_shopping_cart': os.getenv(
+            'DOWNLOAD_SHOPPING_CART_RATE', default='10/min'
+        ),
+        'recipes': os.getenv('RECIPES_RATE'),
+    },
+}
+
+# Пределы одновременных запросов для 'ConcurrencyThrottle'
+# по значениям 'throttle_scope' представлений. В первую очередь
+# защищена генерация PDF-файла списка покупок.
+CONCURRENCY_LIMITS = {
+    'download_shopping_cart': int(
+        os.getenv('DOWNLOAD_SHOPPING_CART_CONCURRENCY', default=4)
+    ),
 }
+if os.getenv('RECIPES_CONCURRENCY'):
+    CONCURRENCY_LIMITS['recipes'] = int(os.getenv('RECIPES_CONCURRENCY'))
+
+CONCURRENCY_SLOT_TIMEOUT = 60
+
+CONCURRENCY_RETRY_AFTER = 1
+
+# Блокировка корзины 'TokenBucketThrottle' в кэше: время жизни
+# (секунд), наибольшее ожидание и интервал опроса.
+THROTTLE_LOCK_TIMEOUT = 1
+
+THROTTLE_LOCK_WAIT = 0.2
+
+THROTTLE_LOCK_POLL_INTERVAL = 0.005
+
+# Наибольшее число ингредиентов в ответе на поиск по названию.
+INGREDIENTS_SEARCH_LIMIT = 50
+
+# Наименьшее сходство названий при нечётком поиске ингредиентов.
+INGREDIENTS_FUZZY_THRESHOLD = 0.3
+
+# Индекс рецептов по ингредиентам для поиска 'что приготовить'.
+# Изменённые рецепты хранятся в индексе отдельно; когда их становится
+# больше COOKING_INDEX_CHANGES_MAX, индекс строится заново в фоне,
+# а поиск до его готовности идёт по прежнему индексу.
+COOKING_INDEX_CHANGES_MAX = 10000
+# Запас (секунд) при выборке рецептов, изменённых после обновления индекса,
+# на транзакции, зафиксированные позже сохранения рецепта.
+COOKING_INDEX_OVERLAP = 60
+# Сколько раз поиск повторяется, исключая из индекса удалённые рецепты.
+COOKING_SEARCH_ATTEMPTS = 3
+# Строить индекс в фоне при запуске веб-сервера, а не при первом поиске.
+COOKING_INDEX_WARM_UP = os.getenv(
+    'COOKING_INDEX_WARM_UP', default='True'
+) == 'True'
+
+# Время (секунд), на которое nginx и браузерам разрешено кэшировать
+# ответы справочников тегов и ингредиентов до перепроверки по ETag.
+CATALOG_CACHE_MAX_AGE = int(os.getenv('CATALOG_CACHE_MAX_AGE', default=3600))
+
+# Наибольшее число готовых ответов в памяти процесса.
+RENDERED_RESPONSES_MAX = 4096
 
 DJOSER = {
     'HIDE_USERS': False,
@@ -182,3 +251,46 @@ NEGATIVE_RESULT = -1
 COEFF_ONE = 1
 
 COEFF_ONE_THOUSAND = 1000
+
+RECIPES_COUNT_CACHE_TIMEOUT = 60 * 15
+
+RECIPES_RESPONSE_CACHE_TIMEOUT = 60 * 5
+
+CACHE_FILL_LOCK_TIMEOUT = 10
+
+CACHE_FILL_POLL_INTERVAL = 0.05
+
+# Способ генерации PDF-файла списка покупок: 'reportlab' или 'xhtml2pdf'.
+SHOPPING_CART_RENDERER = os.getenv(
+    'SHOPPING_CART_RENDERER', default='reportlab'
+)
+
+PDF_CACHE_ROOT = os.getenv(
+    'PDF_CACHE_ROOT', default=os.path.join(BASE_DIR, 'pdf_cache')
+)
+
+PDF_CACHE_MAX_SIZE = int(
+    os.getenv('PDF_CACHE_MAX_SIZE', default=100 * 1024 * 1024)
+)
+
+PDF_CACHE_ACCEL_REDIRECT = os.getenv(
+    'PDF_CACHE_ACCEL_REDIRECT', default='False'
+) == 'True'
+
+PDF_CACHE_ACCEL_PREFIX = '/protected/shopping_carts/'
+
+# Задачи фоновой генерации PDF, зависшие в работе дольше этого времени
+# (секунд), возвращаются в очередь.
+PDF_JOB_STALE_TIMEOUT = 300
+
+PDF_JOB_POLL_INTERVAL = 1
+
+# Выполненные и неудавшиеся задачи генерации PDF хранятся столько
+# секунд; обработчик удаляет устаревшие не чаще раза в интервал.
+PDF_JOB_RETENTION = 24 * 60 * 60
+
+PDF_JOB_PURGE_INTERVAL = 600
+
+RECIPES_COUNT_APPROXIMATE = os.getenv(
+    'RECIPES_COUNT_APPROXIMATE', default='False'
+) == 'True'
@@ -9,8 +9,13 @@ https://docs.djangoproject.com/en/2.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
 application = get_wsgi_application()
+
+if settings.COOKING_INDEX_WARM_UP:
+    from api.v1.cooking import warm_up_cooking_index
+    warm_up_cooking_index()
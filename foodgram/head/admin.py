@@ -1,7 +1,8 @@
 from django.contrib import admin
 
 from .models import (Favorite, Ingredient, IngredientRecipe, Recipe,
-                     ShoppingCart, Subscription, Tag, TagRecipe)
+                     ShoppingCart, ShoppingCartPdfJob, ShoppingListItem,
+                     Subscription, Tag, TagRecipe, get_recipe_update_fields)
 
 
 class IngredientRecipeInline(admin.TabularInline):
@@ -20,9 +21,9 @@ class TagRecipeInline(admin.TabularInline):
 
 class RecipeAdmin(admin.ModelAdmin):
 
-    list_display = ('name', 'author')
+    list_display = ('name', 'author', 'updated_at')
     list_filter = ('name', 'author', 'tags')
-    readonly_fields = ('favorite_count',)
+    readonly_fields = ('favorite_count', 'updated_at')
     inlines = (
         IngredientRecipeInline,
         TagRecipeInline
@@ -33,6 +34,12 @@ class RecipeAdmin(admin.ModelAdmin):
 
     favorite_count.short_description = 'Количество добавлений в избранное'
 
+    def save_model(self, request, obj, form, change):
+        if change:
+            obj.save(update_fields=get_recipe_update_fields())
+        else:
+            obj.save()
+
 
 class IngredientAdmin(admin.ModelAdmin):
 
@@ -45,6 +52,8 @@ admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(IngredientRecipe)
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(ShoppingCart)
+admin.site.register(ShoppingCartPdfJob)
+admin.site.register(ShoppingListItem)
 admin.site.register(Subscription)
 admin.site.register(Tag)
 admin.site.register(TagRecipe)
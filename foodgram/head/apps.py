@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class HeadConfig(AppConfig):
     name = 'head'
+
+    def ready(self):
+        from . import signals  # noqa: F401
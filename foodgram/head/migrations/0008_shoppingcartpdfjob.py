@@ -0,0 +1,38 @@
+# Generated by Django 2.2.19 on 2026-10-18 19:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('head', '0007_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingCartPdfJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('renderer', models.CharField(max_length=20, verbose_name='Способ генерации')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка')], default='pending', max_length=10, verbose_name='Состояние')),
+                ('name', models.CharField(blank=True, max_length=64, verbose_name='Имя файла в хранилище')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата изменения')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pdf_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Задача генерации PDF',
+                'verbose_name_plural': 'Задачи генерации PDF',
+                'ordering': ('id',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='shoppingcartpdfjob',
+            index=models.Index(fields=['status', 'id'], name='pdf_job_status_idx'),
+        ),
+    ]
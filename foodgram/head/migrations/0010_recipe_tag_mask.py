@@ -0,0 +1,35 @@
+# Generated by Django 2.2.19 on 2026-10-18 19:59
+
+from django.db import migrations, models
+from django.db.models import F
+
+TAG_MASK_BITS = 63
+
+
+def fill_tag_masks(apps, schema_editor):
+    """Заполняет маски тегов одним UPDATE на каждый тег."""
+    Tag = apps.get_model('head', 'Tag')
+    Recipe = apps.get_model('head', 'Recipe')
+    TagRecipe = apps.get_model('head', 'TagRecipe')
+    for tag_id in Tag.objects.filter(
+        pk__lte=TAG_MASK_BITS
+    ).values_list('pk', flat=True):
+        Recipe.objects.filter(
+            pk__in=TagRecipe.objects.filter(tag_id=tag_id).values('recipe')
+        ).update(tag_mask=F('tag_mask') + (1 << (tag_id - 1)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('head', '0009_ingredient_name_trgm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='tag_mask',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Маска тегов'),
+        ),
+        migrations.RunPython(fill_tag_masks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 2.2.19 on 2026-10-18 20:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('head', '0010_recipe_tag_mask'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['recipe', 'user'], name='favorite_recipe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ingredientrecipe',
+            index=models.Index(fields=['recipe', 'ingredient'], name='ingredient_recipe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppingcart',
+            index=models.Index(fields=['recipe', 'user'], name='shopping_cart_recipe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['author', 'user'], name='subscription_author_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tagrecipe',
+            index=models.Index(fields=['tag', 'recipe'], name='tag_recipe_idx'),
+        ),
+        migrations.AlterField(
+            model_name='favorite',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='lover', to='head.Recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AlterField(
+            model_name='ingredientrecipe',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='head.Recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AlterField(
+            model_name='shoppingcart',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='buyer', to='head.Recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AlterField(
+            model_name='subscription',
+            name='author',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='subscriber', to=settings.AUTH_USER_MODEL, verbose_name='Подписываемый'),
+        ),
+        migrations.AlterField(
+            model_name='tagrecipe',
+            name='tag',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='head.Tag', verbose_name='Тег'),
+        ),
+    ]
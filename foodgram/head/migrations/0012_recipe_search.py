@@ -0,0 +1,56 @@
+from django.db import migrations
+
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(text, '')), 'B')"
+)
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Полнотекстовый индекс названия и описания рецептов: столбец
+    tsvector с индексом GIN в PostgreSQL, таблица FTS5 в SQLite.
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'ALTER TABLE head_recipe ADD COLUMN search_vector tsvector'
+        )
+        schema_editor.execute(
+            f'UPDATE head_recipe SET search_vector = {SEARCH_VECTOR}'
+        )
+        schema_editor.execute(
+            'CREATE INDEX head_recipe_search_gin '
+            'ON head_recipe USING gin (search_vector)'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE head_recipe_fts USING fts5('
+            "name, text, tokenize='unicode61 remove_diacritics 2', "
+            "prefix='2 3')"
+        )
+        schema_editor.execute(
+            'INSERT INTO head_recipe_fts (rowid, name, text) '
+            'SELECT id, name, text FROM head_recipe'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'ALTER TABLE head_recipe DROP COLUMN IF EXISTS search_vector'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS head_recipe_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('head', '0011_relation_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 2.2.19 on 2026-10-18 20:33
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+
+
+def fill_favorites_counts(apps, schema_editor):
+    """Заполняет счётчики избранного одним UPDATE с подзапросом."""
+    Recipe = apps.get_model('head', 'Recipe')
+    Favorite = apps.get_model('head', 'Favorite')
+    Recipe.objects.filter(
+        pk__in=Favorite.objects.values('recipe')
+    ).update(favorites_count=Subquery(
+        Favorite.objects.filter(recipe=OuterRef('pk')).order_by().values(
+            'recipe'
+        ).annotate(count=Count('pk')).values('count')
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('head', '0012_recipe_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлений в избранное'),
+        ),
+        migrations.RunPython(fill_favorites_counts, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['cooking_time', 'id'], name='recipe_cooking_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['favorites_count', 'id'], name='recipe_popular_idx'),
+        ),
+    ]
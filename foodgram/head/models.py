@@ -5,6 +5,29 @@ from django.db import models
 
 from users.models import User
 
+# Теги с id до 63 представлены битами поля 'Recipe.tag_mask'
+# (знаковый бит не используется).
+TAG_MASK_BITS = 63
+
+
+def get_tag_bit(tag_id):
+    """Бит тега в 'Recipe.tag_mask' или 0, если тег в маску не входит."""
+    if 0 < tag_id <= TAG_MASK_BITS:
+        return 1 << (tag_id - 1)
+    return 0
+
+
+def get_tag_mask(tag_ids):
+    """Битовая маска набора тегов."""
+    mask = 0
+    for tag_id in tag_ids:
+        mask |= get_tag_bit(tag_id)
+    return mask
+
+
+# Поля 'Recipe', которые поддерживают сигналы запросами UPDATE.
+RECIPE_SIGNAL_FIELDS = ('tag_mask', 'favorites_count')
+
 
 class Recipe(models.Model):
     """Модель рецептов."""
@@ -42,20 +65,63 @@ class Recipe(models.Model):
         verbose_name='Время приготовления (мин)',
         validators=[MinValueValidator(settings.COEFF_ONE)]
     )
+    # Меняется и при изменении тегов и ингредиентов рецепта; по ней
+    # индекс 'что приготовить' находит рецепты, изменённые после
+    # его построения.
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name='Дата изменения'
+    )
+    tag_mask = models.BigIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Маска тегов'
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Добавлений в избранное'
+    )
 
     class Meta:
         """
         Сортирует сообщения по id (сначала новые)
         и добавляет русские название в админке.
+        Индексы поддерживают сортировки списка рецептов
+        по времени приготовления и популярности.
         """
         ordering = ('-id', )
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
+        indexes = [
+            models.Index(
+                fields=['cooking_time', 'id'],
+                name='recipe_cooking_time_idx'
+            ),
+            models.Index(
+                fields=['favorites_count', 'id'],
+                name='recipe_popular_idx'
+            )
+        ]
+
     def __str__(self):
         return self.name
 
 
+def get_recipe_update_fields():
+    """
+    Поля, которые записываются при изменении загруженного рецепта:
+    все, кроме поддерживаемых сигналами, значения которых в объекте
+    могли устареть с момента загрузки.
+    """
+    return [
+        field.name for field in Recipe._meta.concrete_fields
+        if not field.primary_key and field.name not in RECIPE_SIGNAL_FIELDS
+    ]
+
+
 class Ingredient(models.Model):
     """Модель ингредиента."""
 
@@ -121,6 +187,7 @@ class IngredientRecipe(models.Model):
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
+        db_index=False,
         verbose_name='Рецепт'
     )
     amount = models.PositiveSmallIntegerField(
@@ -135,6 +202,13 @@ class IngredientRecipe(models.Model):
         verbose_name = 'Ингредиент + рецепт'
         verbose_name_plural = 'Ингредиенты + рецепты'
 
+        indexes = [
+            models.Index(
+                fields=['recipe', 'ingredient'],
+                name='ingredient_recipe_idx'
+            )
+        ]
+
     def __str__(self):
         return f'{self.ingredient} => {self.recipe}'
 
@@ -145,6 +219,7 @@ class TagRecipe(models.Model):
     tag = models.ForeignKey(
         Tag,
         on_delete=models.CASCADE,
+        db_index=False,
         verbose_name='Тег'
     )
     recipe = models.ForeignKey(
@@ -160,6 +235,13 @@ class TagRecipe(models.Model):
         verbose_name = 'Тег + рецепт'
         verbose_name_plural = 'Теги + рецепты'
 
+        indexes = [
+            models.Index(
+                fields=['tag', 'recipe'],
+                name='tag_recipe_idx'
+            )
+        ]
+
     def __str__(self):
         return f'{self.tag} => {self.recipe}'
 
@@ -177,6 +259,7 @@ class Subscription(models.Model):
         User,
         on_delete=models.CASCADE,
         related_name='subscriber',
+        db_index=False,
         verbose_name='Подписываемый'
     )
 
@@ -198,6 +281,13 @@ class Subscription(models.Model):
             )
         ]
 
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='subscription_author_idx'
+            )
+        ]
+
     def __str__(self):
         return f'{self.user} => {self.author}'
 
@@ -215,6 +305,7 @@ class ShoppingCart(models.Model):
         Recipe,
         on_delete=models.CASCADE,
         related_name='buyer',
+        db_index=False,
         verbose_name='Рецепт'
     )
 
@@ -232,6 +323,13 @@ class ShoppingCart(models.Model):
             )
         ]
 
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'],
+                name='shopping_cart_recipe_idx'
+            )
+        ]
+
     def __str__(self):
         return f'{self.user} => {self.recipe}'
 
@@ -249,6 +347,7 @@ class Favorite(models.Model):
         Recipe,
         on_delete=models.CASCADE,
         related_name='lover',
+        db_index=False,
         verbose_name='Рецепт'
     )
 
@@ -266,5 +365,124 @@ class Favorite(models.Model):
             )
         ]
 
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'],
+                name='favorite_recipe_idx'
+            )
+        ]
+
     def __str__(self):
         return f'{self.user} => {self.recipe}'
+
+
+class ShoppingListItem(models.Model):
+    """
+    Модель суммарного количества ингредиента в списке покупок
+    пользователя. Поддерживается при изменении списка покупок
+    и ингредиентов рецептов.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент'
+    )
+    amount = models.PositiveIntegerField(
+        verbose_name='Количество'
+    )
+
+    class Meta:
+        """
+        Добавляет русские названия в админке.
+        """
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списков покупок'
+
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user} => {self.ingredient}'
+
+
+class ShoppingCartPdfJob(models.Model):
+    """
+    Модель задачи фоновой генерации PDF-файла списка покупок.
+    Таблица служит очередью для команды 'pdf_worker'.
+    """
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='pdf_jobs',
+        verbose_name='Пользователь'
+    )
+    renderer = models.CharField(
+        max_length=20,
+        verbose_name='Способ генерации'
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+        verbose_name='Состояние'
+    )
+    name = models.CharField(
+        max_length=64,
+        blank=True,
+        verbose_name='Имя файла в хранилище'
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name='Ошибка'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата создания'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+
+    class Meta:
+        """
+        Сортирует задачи в порядке поступления
+        и добавляет русские названия в админке.
+        """
+        ordering = ('id',)
+        verbose_name = 'Задача генерации PDF'
+        verbose_name_plural = 'Задачи генерации PDF'
+
+        indexes = [
+            models.Index(
+                fields=['status', 'id'],
+                name='pdf_job_status_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user} => {self.status}'
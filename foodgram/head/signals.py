@@ -0,0 +1,91 @@
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Favorite, IngredientRecipe, Recipe, TagRecipe, get_tag_bit
+
+
+def touch_recipes(*recipe_ids):
+    """Обновляет дату изменения рецептов."""
+    Recipe.objects.filter(pk__in=recipe_ids).update(updated_at=timezone.now())
+
+
+def update_tag_masks(*recipe_ids):
+    """Пересчитывает маски тегов рецептов по связям 'TagRecipe'."""
+    masks = dict.fromkeys(recipe_ids, 0)
+    for recipe_id, tag_id in TagRecipe.objects.filter(
+        recipe__in=recipe_ids
+    ).values_list('recipe', 'tag'):
+        masks[recipe_id] |= get_tag_bit(tag_id)
+    for recipe_id, mask in masks.items():
+        Recipe.objects.filter(pk=recipe_id).update(tag_mask=mask)
+
+
+@receiver(post_save, sender=TagRecipe)
+@receiver(post_delete, sender=TagRecipe)
+@receiver(post_save, sender=IngredientRecipe)
+@receiver(post_delete, sender=IngredientRecipe)
+def recipe_relation_changed(sender, instance, **kwargs):
+    """Изменение тегов и ингредиентов рецепта меняет и сам рецепт."""
+    touch_recipes(instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_relations_changed(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        touch_recipes(instance.pk)
+    elif pk_set:
+        touch_recipes(*pk_set)
+
+
+@receiver(post_save, sender=TagRecipe)
+@receiver(post_delete, sender=TagRecipe)
+def recipe_tag_changed(sender, instance, **kwargs):
+    update_tag_masks(instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set,
+                        **kwargs):
+    """
+    Поддерживает маски тегов при изменении тегов рецепта
+    и рецептов тега через менеджеры связей.
+    """
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        update_tag_masks(instance.pk)
+    elif pk_set:
+        update_tag_masks(*pk_set)
+    elif action == 'post_clear':
+        # Рецепты очищенного тега уже неизвестны, пересчитываются все
+        # рецепты с его битом.
+        bit = get_tag_bit(instance.pk)
+        if bit:
+            update_tag_masks(*Recipe.objects.annotate(
+                tag_bit=F('tag_mask').bitand(bit)
+            ).exclude(tag_bit=0).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_added(sender, instance, created, **kwargs):
+    """
+    Поддерживает счётчик избранного рецепта для сортировки
+    по популярности без подсчёта строк 'Favorite' в каждом запросе.
+    """
+    if created:
+        Recipe.objects.filter(pk=instance.recipe_id).update(
+            favorites_count=F('favorites_count') + 1
+        )
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_removed(sender, instance, **kwargs):
+    Recipe.objects.filter(
+        pk=instance.recipe_id, favorites_count__gt=0
+    ).update(favorites_count=F('favorites_count') - 1)
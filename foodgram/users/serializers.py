@@ -3,6 +3,7 @@ from djoser.serializers import UserCreateSerializer
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
+from api.v1.mixins import SparseFieldsMixin
 from head.models import Recipe, Subscription
 from users.models import User
 
@@ -14,8 +15,11 @@ class CustomUserCreateSerializer(UserCreateSerializer):
         fields = ('email', 'username', 'first_name', 'last_name', 'password')
 
 
-class UserSerializer(serializers.ModelSerializer):
-    """Сериализатор для пользователей."""
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """
+    Сериализатор для пользователей.
+    Набор полей ограничивается параметрами запроса 'fields' и 'omit'.
+    """
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
@@ -31,9 +35,11 @@ class UserSerializer(serializers.ModelSerializer):
 
     def get_is_subscribed(self, obj):
         user = self.context['request'].user
-        return (
-            user.is_authenticated and bool(obj.subscriber.filter(user=user))
-        )
+        if not user.is_authenticated:
+            return False
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return obj.subscriber.filter(user=user).exists()
 
 
 class FavoriteShoppingSerializer(serializers.ModelSerializer):
@@ -1,11 +1,15 @@
 from django.contrib.auth import get_user_model
+from django.db.models import Exists, OuterRef
 from djoser.views import UserViewSet
 from rest_framework import serializers, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from api.v1.mixins import get_requested_fields
 from api.v1.paginators import CustomPagination
-from .serializers import SubscriptionCreateSerializer, SubscriptionSerializer
+from head.models import Subscription
+from .serializers import (SubscriptionCreateSerializer, SubscriptionSerializer,
+                          UserSerializer)
 
 User = get_user_model()
 
@@ -15,6 +19,27 @@ class UserCustomViewSet(UserViewSet):
 
     pagination_class = CustomPagination
 
+    def get_queryset(self):
+        """
+        Вычисляет подписку текущего пользователя на авторов подзапросом,
+        если поле 'is_subscribed' запрошено.
+        """
+        queryset = super().get_queryset()
+        user = self.request.user
+        if (
+            self.action not in ('list', 'retrieve')
+            or user.is_anonymous
+            or 'is_subscribed' not in get_requested_fields(
+                self.request, UserSerializer.Meta.fields
+            )
+        ):
+            return queryset
+        return queryset.annotate(
+            is_subscribed=Exists(Subscription.objects.filter(
+                author=OuterRef('pk'), user=user
+            ))
+        )
+
     @action(
         methods=['get'], detail=False,
         serializer_class=SubscriptionSerializer